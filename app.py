@@ -1,48 +1,141 @@
+import asyncio
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from flask import Flask, render_template
-from fastapi.middleware.wsgi import WSGIMiddleware
 
-from config import Config
-from routes import user_routes, attendance_routes, api_routes
+from config import Config, Database
+from routes import user_routes, attendance_routes, api_routes, metrics_routes
 from services.cloudinary_service import CloudinaryService
-
-# Initialize services
-CloudinaryService.initialize()
+from services.attendance_service import AttendanceService
+from services.face_gallery import FaceGallery
+from services.gallery_sync import GallerySync
+from services.worker_pool import RecognitionPool
+from services.upload_queue import UploadQueue
+from services.schedule import Schedule
+from services.startup import Startup
+from services.metrics import Metrics
 
 # ============================================================================
 # FLASK APPLICATION (Frontend)
 # ============================================================================
 
-flask_app = Flask(__name__)
-flask_app.secret_key = Config.SECRET_KEY
+def create_frontend():
+    """Flask app serving the HTML pages"""
+    from flask import Flask, render_template
+
+    flask_app = Flask(__name__)
+    flask_app.secret_key = Config.SECRET_KEY
+
+    @flask_app.route('/')
+    def index():
+        return render_template('index.html')
+
+    @flask_app.route('/register')
+    def register():
+        return render_template('register.html')
+
+    @flask_app.route('/recognize')
+    def recognize():
+        return render_template('recognize.html')
+
+    @flask_app.route('/attendance')
+    def attendance():
+        return render_template('attendance.html')
+
+    @flask_app.route('/users')
+    def users():
+        return render_template('users.html')
+
+    return flask_app
 
-@flask_app.route('/')
-def index():
-    return render_template('index.html')
+class Frontend:
+    """ASGI wrapper that imports Flask on first use (or during warm-up)
+    instead of at module import"""
 
-@flask_app.route('/register')
-def register():
-    return render_template('register.html')
+    def __init__(self):
+        self.app = None
 
-@flask_app.route('/recognize')
-def recognize():
-    return render_template('recognize.html')
+    def load(self):
+        if self.app is None:
+            from fastapi.middleware.wsgi import WSGIMiddleware
+            self.app = WSGIMiddleware(create_frontend())
+        return self.app
 
-@flask_app.route('/attendance')
-def attendance():
-    return render_template('attendance.html')
+    async def __call__(self, scope, receive, send):
+        await self.load()(scope, receive, send)
 
-@flask_app.route('/users')
-def users():
-    return render_template('users.html')
+frontend = Frontend()
 
 # ============================================================================
 # FASTAPI APPLICATION (Backend API)
 # ============================================================================
 
-api = FastAPI(title="Face Recognition API", version="1.0.0")
+def connect_database():
+    """Connect (or ping the existing client); raises while MongoDB is unreachable"""
+    if Database.client is None:
+        if not Database.connect():
+            raise RuntimeError("No database connection")
+    else:
+        Database.client.admin.command("ping")
+
+def load_gallery():
+    """Map the snapshot and catch up, or build the gallery from MongoDB"""
+    if FaceGallery.load_snapshot():
+        # Catch up on registrations/deletions made after the snapshot
+        GallerySync.reconcile()
+    elif not FaceGallery.load():
+        raise RuntimeError("No database connection")
+    elif Config.GALLERY_SNAPSHOT_DIR:
+        with Startup.phase("gallery_snapshot"):
+            FaceGallery.save_snapshot()
+    FaceGallery.wait_for_index()
+
+def warm_up():
+    """Heavy startup work, run after the server starts accepting requests.
+
+    The MongoDB phases are retried until the database is reachable; the
+    service is only marked ready once they have succeeded.
+    """
+    if "database" in Startup.failed and not Startup.retry_phase("database", connect_database):
+        return
+    if not Startup.retry_phase("indexes", AttendanceService.ensure_indexes):
+        return
+    if not Startup.retry_phase("gallery", load_gallery):
+        return
+    with Startup.phase("gallery_sync"):
+        GallerySync.start()
+    with Startup.phase("recognition_workers"):
+        RecognitionPool.warm()
+    with Startup.phase("frontend"):
+        frontend.load()
+    if not Startup.failed:
+        Startup.mark_ready()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Runs in the server process only, not when worker processes re-import this module
+    with Startup.phase("database"):
+        connect_database()
+    with Startup.phase("cloudinary"):
+        CloudinaryService.initialize()
+    with Startup.phase("schedule"):
+        Schedule.load()
+    with Startup.phase("background_services"):
+        RecognitionPool.start()
+        UploadQueue.start()
+        Metrics.register_gauges()
+    asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+    yield
+
+    Startup.stop()
+    GallerySync.stop()
+    RecognitionPool.shutdown()
+    UploadQueue.stop()
+    Database.close()
+
+api = FastAPI(title="Face Recognition API", version="1.0.0", lifespan=lifespan)
 
 api.add_middleware(
     CORSMiddleware,
@@ -56,13 +149,14 @@ api.add_middleware(
 api.include_router(user_routes.router, prefix="/api", tags=["users"])
 api.include_router(attendance_routes.router, prefix="/api", tags=["attendance"])
 api.include_router(api_routes.router, prefix="/api", tags=["general"])
+api.include_router(metrics_routes.router)
 
 # ============================================================================
 # MOUNT FLASK TO FASTAPI
 # ============================================================================
 
-# Mount Flask app to root path "/"
-api.mount("/", WSGIMiddleware(flask_app))
+# Mount Flask app to root path "/" (built lazily, see Frontend)
+api.mount("/", frontend)
 
 if __name__ == "__main__":
     print("=" * 60)
@@ -72,5 +166,9 @@ if __name__ == "__main__":
     print("FastAPI (API):   http://localhost:5000/docs")
     print("=" * 60)
     
-    # Run uvicorn server
-    uvicorn.run("app:api", host="0.0.0.0", port=5000, reload=True)
+    # Run uvicorn server; several API processes only pay off with a shared
+    # recognition server (RECOGNITION_SOCKET), otherwise each starts its own pool
+    if Config.API_WORKERS > 1:
+        uvicorn.run("app:api", host="0.0.0.0", port=5000, workers=Config.API_WORKERS)
+    else:
+        uvicorn.run("app:api", host="0.0.0.0", port=5000, reload=True)
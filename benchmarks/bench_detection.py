@@ -0,0 +1,102 @@
+"""Accuracy / latency of detection scale and upsample settings on local images.
+
+Every setting is compared with a full-resolution reference run
+(scale 1.0, same upsample as the first --upsample value):
+
+    python -m benchmarks.bench_detection --images ./samples --scales 1.0 0.5 0.25 --upsample 0 1 2
+"""
+import argparse
+import os
+import time
+import cv2
+import numpy as np
+import face_recognition
+from services.face_recognition import FaceRecognitionService
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(folder):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        img = cv2.imread(os.path.join(folder, name), cv2.IMREAD_COLOR)
+        if img is not None:
+            images.append((name, cv2.cvtColor(img, cv2.COLOR_BGR2RGB)))
+    return images
+
+
+def iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area = lambda box: (box[1] - box[3]) * (box[2] - box[0])
+    union = area(a) + area(b) - inter
+    return inter / union if union else 0.0
+
+
+def run(images, scale, upsample):
+    """Return per-image (locations, encodings) and detect/encode latencies in ms"""
+    results, detect_ms, encode_ms = [], [], []
+    for _, rgb in images:
+        start = time.perf_counter()
+        locations = FaceRecognitionService.detect_faces(rgb, scale, upsample)
+        mid = time.perf_counter()
+        encodings = face_recognition.face_encodings(rgb, locations)
+        end = time.perf_counter()
+        results.append((locations, encodings))
+        detect_ms.append((mid - start) * 1000)
+        encode_ms.append((end - mid) * 1000)
+    return results, np.array(detect_ms), np.array(encode_ms)
+
+
+def compare(reference, results):
+    """Recall of reference faces (IoU >= 0.5), extra detections and encoding drift"""
+    found = total = extra = 0
+    drift = []
+    for (ref_locs, ref_encs), (locs, encs) in zip(reference, results):
+        total += len(ref_locs)
+        used = set()
+        for ref_loc, ref_enc in zip(ref_locs, ref_encs):
+            scores = [(iou(ref_loc, loc), j) for j, loc in enumerate(locs) if j not in used]
+            if scores:
+                best, j = max(scores)
+                if best >= 0.5:
+                    used.add(j)
+                    found += 1
+                    drift.append(float(np.linalg.norm(ref_enc - encs[j])))
+        extra += len(locs) - len(used)
+    recall = found / total if total else 1.0
+    return recall, extra, (float(np.mean(drift)) if drift else 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", required=True, help="Folder of local test images")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.25])
+    parser.add_argument("--upsample", type=int, nargs="+", default=[1, 0, 2])
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+    pixels = np.mean([rgb.shape[0] * rgb.shape[1] for _, rgb in images])
+    print(f"{len(images)} images, mean {pixels / 1e6:.2f} MP")
+
+    reference, _, _ = run(images, 1.0, args.upsample[0])
+    print(f"Reference: scale=1.0 upsample={args.upsample[0]}, "
+          f"{sum(len(locs) for locs, _ in reference)} faces")
+    print(f"{'scale':>6} {'up':>3} {'detect p50':>11} {'detect p95':>11} {'encode p50':>11} "
+          f"{'recall':>7} {'extra':>6} {'drift':>7}")
+
+    for upsample in args.upsample:
+        for scale in args.scales:
+            results, detect_ms, encode_ms = run(images, scale, upsample)
+            recall, extra, drift = compare(reference, results)
+            print(f"{scale:6.2f} {upsample:3d} {np.percentile(detect_ms, 50):9.1f}ms "
+                  f"{np.percentile(detect_ms, 95):9.1f}ms {np.percentile(encode_ms, 50):9.1f}ms "
+                  f"{recall:7.3f} {extra:6d} {drift:7.4f}")
+
+
+if __name__ == "__main__":
+    main()
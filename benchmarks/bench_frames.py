@@ -0,0 +1,71 @@
+"""Frame handoff to a worker process: shared-memory slots vs pickling.
+
+Round-trips frames of several sizes to a spawned worker that wraps each one
+in a numpy array (as cv2.imdecode does) and answers with a small result.
+The pickle transport sends the bytes through the pipe; the shared-memory
+transport copies them into a FrameSlots slot and sends only the FrameRef:
+
+    python -m benchmarks.bench_frames --sizes 150000 1000000 6220800 --frames 300
+"""
+import argparse
+import multiprocessing
+import time
+import numpy as np
+from services.frame_slots import FrameSlots
+
+
+def worker(conn):
+    while True:
+        message = conn.recv()
+        if message is None:
+            return
+        kind, payload = message
+        data = payload.view() if kind == "slot" else payload
+        frame = np.frombuffer(data, np.uint8)
+        conn.send((len(frame), int(frame[-1])))
+
+
+def measure(conn, frame, frames, slots):
+    started = time.perf_counter()
+    for _ in range(frames):
+        if slots is None:
+            conn.send(("pickle", frame))
+            conn.recv()
+        else:
+            slot = slots.acquire()
+            conn.send(("slot", slots.write(slot, frame)))
+            conn.recv()
+            slots.release(slot)
+    return (time.perf_counter() - started) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[150_000, 1_000_000, 1920 * 1080 * 3],
+                        help="Frame sizes in bytes (JPEG-like to decoded 1080p RGB)")
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe()
+    process = context.Process(target=worker, args=(child,))
+    process.start()
+    slots = FrameSlots(2, max(args.sizes))
+    try:
+        print(f"{'bytes':>10} {'pickle us':>10} {'shm us':>10} {'speedup':>8} {'shm MB/s':>9}")
+        for size in args.sizes:
+            frame = np.random.default_rng(size).integers(0, 255, size, dtype=np.uint8).tobytes()
+            measure(parent, frame, 10, None)
+            measure(parent, frame, 10, slots)
+            pickled = measure(parent, frame, args.frames, None)
+            shared = measure(parent, frame, args.frames, slots)
+            print(f"{size:10d} {pickled * 1e6:10.1f} {shared * 1e6:10.1f} {pickled / shared:8.2f} "
+                  f"{size / shared / 2**20:9.0f}")
+    finally:
+        parent.send(None)
+        process.join()
+        slots.close()
+
+
+if __name__ == "__main__":
+    main()
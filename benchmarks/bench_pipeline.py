@@ -0,0 +1,232 @@
+"""End-to-end benchmark of the /recognize pipeline on synthetic galleries.
+
+MongoDB is replaced by an in-memory stand-in and uploads by a no-op, so it
+runs offline on a CPU-only box. Without --images, frames carry synthetic
+encodings (matching, duplicate check and attendance writes are measured);
+with --images, local images are replayed through decode / detect / encode
+as well (requires face_recognition). Results can be saved and compared:
+
+    python -m benchmarks.bench_pipeline --users 1000 10000 100000 --save baseline.json
+    python -m benchmarks.bench_pipeline --users 1000 10000 100000 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import time
+import numpy as np
+from config import Config, Database
+from benchmarks.bench_ann import synthetic_gallery, DIM
+from benchmarks.memory_db import MemoryDatabase
+from services.attendance_cache import MarkedCache
+from services.encoding_codec import EncodingCodec
+from services.face_gallery import FaceGallery
+from services.metrics import Metrics
+from services.recognition_pipeline import RecognitionPipeline
+from services.stats_service import StatsService
+from services.upload_queue import UploadQueue
+from services.worker_pool import RecognitionPool
+
+# Far enough ahead that the shift never ends, so MarkedCache stays warm
+BENCH_DATE = "2099-01-05"
+BENCH_SHIFT = 1
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_image_bytes(folder):
+    names = sorted(n for n in os.listdir(folder) if n.lower().endswith(IMAGE_EXTENSIONS))
+    images = []
+    for name in names:
+        with open(os.path.join(folder, name), "rb") as f:
+            images.append(f.read())
+    return images
+
+
+def seed_gallery(num_users, per_user, rng):
+    """Fresh in-memory database holding ``num_users`` synthetic users"""
+    Database.db = MemoryDatabase()
+    MarkedCache.invalidate()
+    StatsService.invalidate()
+    centers, encodings, _ = synthetic_gallery(num_users, per_user, rng)
+    Database.get_users_collection().insert_many([
+        {
+            "user_id": f"bench{i:06d}",
+            "name": f"Bench User {i}",
+            "face_encodings": EncodingCodec.pack(encodings[i * per_user:(i + 1) * per_user]),
+            "num_encodings": per_user
+        }
+        for i in range(num_users)
+    ])
+    return centers
+
+
+def synthetic_frames(centers, args, rng):
+    """(locations, encodings) per frame: known users with noise plus strangers"""
+    frames = []
+    for _ in range(args.frames):
+        faces = []
+        for j in range(args.faces):
+            if rng.random() < args.known:
+                center = centers[rng.integers(len(centers))]
+            else:
+                center = rng.normal(0.0, 0.056, DIM).astype(np.float32)
+            faces.append((center + rng.normal(0.0, 0.022, DIM)).astype(np.float32))
+        locations = [(20, 80 * j + 70, 90, 80 * j + 10) for j in range(len(faces))]
+        frames.append((locations, faces))
+    return frames
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return {
+        "count": int(len(values)),
+        "mean": round(float(values.mean()), 4),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p95": round(float(np.percentile(values, 95)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4)
+    }
+
+
+async def replay(frames, images):
+    """Run every frame through RecognitionPipeline.process_frame in-process"""
+    samples = {}
+    frame_iter = iter(frames)
+
+    async def in_process(fn, *args, timeout=None):
+        if images:
+            return fn(*args)
+        locations, encodings = next(frame_iter)
+        return locations, encodings, None
+
+    RecognitionPool.run = staticmethod(in_process)
+    RecognitionPool.run_frame = staticmethod(in_process)
+    started = time.perf_counter()
+    count = len(frames) if not images else len(images)
+    for i in range(count):
+        image_bytes = images[i] if images else b""
+        await RecognitionPipeline.process_frame(image_bytes, BENCH_DATE, BENCH_SHIFT)
+        for stage, seconds in Metrics.drain_worker_timings():
+            samples.setdefault(stage, []).append(seconds)
+    return samples, time.perf_counter() - started
+
+
+def run_scenario(num_users, args, images, rng):
+    rss_before = rss_mb()
+    centers = seed_gallery(num_users, args.per_user, rng)
+
+    started = time.perf_counter()
+    FaceGallery.load()
+    FaceGallery.wait_for_index()
+    load_s = time.perf_counter() - started
+
+    frames = synthetic_frames(centers, args, rng) if not images else []
+    UploadQueue.start(uploader=lambda image_bytes, folder, public_id: f"memory://{folder}/{public_id}", num_workers=1)
+    samples, elapsed = asyncio.run(replay(frames, images))
+    # Waits for queued snapshot uploads so they are not counted in the next run
+    UploadQueue.stop()
+    for stage, seconds in Metrics.drain_worker_timings():
+        samples.setdefault(stage, []).append(seconds)
+
+    num_frames = len(images) if images else len(frames)
+    return {
+        "users": num_users,
+        "encodings": FaceGallery.size(),
+        "frames": num_frames,
+        "gallery_load_s": round(load_s, 4),
+        "throughput_fps": round(num_frames / elapsed, 2),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "gallery_mb": round(FaceGallery.encodings.nbytes / 2**20, 1),
+        "stages_ms": {stage: percentiles(values) for stage, values in sorted(samples.items())}
+    }
+
+
+def print_scenario(name, result):
+    print(f"\n== {name}: {result['encodings']} encodings, index={Config.GALLERY_INDEX} ==")
+    print(f"gallery load {result['gallery_load_s'] * 1000:.1f} ms, {result['throughput_fps']:.1f} frames/s, "
+          f"RSS {result['rss_mb']:.0f} MB (+{result['rss_growth_mb']:.0f}), peak {result['peak_rss_mb']:.0f} MB, "
+          f"gallery {result['gallery_mb']:.1f} MB")
+    print(f"{'stage':>18} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for stage, stats in result["stages_ms"].items():
+        print(f"{stage:>18} {stats['count']:6d} {stats['mean']:9.3f} {stats['p50']:9.3f} "
+              f"{stats['p95']:9.3f} {stats['p99']:9.3f}")
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a saved run; returns the number of regressions"""
+    regressions = 0
+    print(f"\n== Compared with baseline (tolerance {tolerance:.0%}) ==")
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            print(f"{name}: not in baseline")
+            continue
+        change = result["throughput_fps"] / base["throughput_fps"] - 1 if base["throughput_fps"] else 0.0
+        flag = "  REGRESSION" if change < -tolerance else ""
+        regressions += bool(flag)
+        print(f"{name}: throughput {base['throughput_fps']:.1f} -> {result['throughput_fps']:.1f} fps ({change:+.1%}){flag}")
+        for stage, stats in result["stages_ms"].items():
+            base_stats = base["stages_ms"].get(stage)
+            if not base_stats or not base_stats["p95"]:
+                continue
+            change = stats["p95"] / base_stats["p95"] - 1
+            flag = "  REGRESSION" if change > tolerance else ""
+            regressions += bool(flag)
+            print(f"  {stage:>18} p95 {base_stats['p95']:9.3f} -> {stats['p95']:9.3f} ms ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--per-user", type=int, default=5)
+    parser.add_argument("--frames", type=int, default=500, help="Synthetic frames per gallery size")
+    parser.add_argument("--faces", type=int, default=2, help="Faces per synthetic frame")
+    parser.add_argument("--known", type=float, default=0.8, help="Share of faces that belong to a user")
+    parser.add_argument("--images", help="Replay a folder of local images instead of synthetic frames")
+    parser.add_argument("--index", choices=["flat", "centroid", "ivf"], default=Config.GALLERY_INDEX)
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    Config.GALLERY_INDEX = args.index
+    images = load_image_bytes(args.images) if args.images else None
+    if args.images and not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    rng = np.random.default_rng(args.seed)
+    Metrics.collect_in_worker()
+
+    results = {}
+    for num_users in args.users:
+        name = f"users={num_users}" + (",images" if images else "")
+        results[name] = run_scenario(num_users, args, images, rng)
+        print_scenario(name, results[name])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"index": args.index, "per_user": args.per_user, "scenarios": results}, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
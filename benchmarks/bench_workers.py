@@ -0,0 +1,91 @@
+"""Throughput of the shared recognition server by number of worker processes.
+
+Starts a RecognitionServer per worker count on a temporary Unix socket and
+keeps it saturated from a client, the way API processes would. Without
+--images each job is a fixed slice of pure-Python CPU work, so the result
+shows how the transport and scheduling scale with cores; with --images,
+local images go through FaceRecognitionService.extract_all_faces:
+
+    python -m benchmarks.bench_workers --workers 1 2 4 8
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --images ./samples
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import tempfile
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from benchmarks.bench_pipeline import load_image_bytes
+from config import Config
+from services.recognition_server import RecognitionClient, RecognitionServer
+
+
+def cpu_job(iterations):
+    total = 0
+    for i in range(iterations):
+        total += i * i % 7
+    return total
+
+
+def serve(path, workers):
+    RecognitionServer(path, workers, queue_size=workers).serve_forever()
+
+
+def measure(path, jobs, workers, num_jobs):
+    client = RecognitionClient(path)
+    client.connect(wait=30)
+    # Prime every worker (model load) before timing
+    wait([client.submit(*jobs[i % len(jobs)]) for i in range(workers)])
+
+    started = time.perf_counter()
+    running, submitted = set(), 0
+    while submitted < num_jobs or running:
+        while submitted < num_jobs and len(running) < 2 * workers:
+            running.add(client.submit(*jobs[submitted % len(jobs)]))
+            submitted += 1
+        done, running = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            future.result()
+    elapsed = time.perf_counter() - started
+    client.shutdown()
+    return num_jobs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--jobs", type=int, default=200, help="Jobs per worker count")
+    parser.add_argument("--work", type=int, default=300000, help="Loop iterations per synthetic job")
+    parser.add_argument("--images", help="Run extract_all_faces on a folder of local images")
+    args = parser.parse_args()
+
+    if args.images:
+        from services.face_recognition import FaceRecognitionService
+        jobs = [(FaceRecognitionService.extract_all_faces, image) for image in load_image_bytes(args.images)]
+        if not jobs:
+            raise SystemExit(f"No images found in {args.images}")
+    else:
+        jobs = [(cpu_job, args.work)]
+
+    # One-off key for the benchmark's servers (inherited by the spawned process)
+    os.environ["RECOGNITION_AUTHKEY"] = Config.RECOGNITION_AUTHKEY = Config.RECOGNITION_AUTHKEY or secrets.token_hex(16)
+    context = multiprocessing.get_context("spawn")
+    print(f"{'workers':>8} {'jobs/s':>10} {'speedup':>8} {'efficiency':>10}")
+    single = None
+    for workers in args.workers:
+        path = os.path.join(tempfile.mkdtemp(), "recognition.sock")
+        server = context.Process(target=serve, args=(path, workers))
+        server.start()
+        try:
+            rate = measure(path, jobs, workers, args.jobs)
+        finally:
+            server.terminate()
+            server.join()
+        single = single or rate / workers
+        speedup = rate / single
+        print(f"{workers:8d} {rate:10.1f} {speedup:8.2f} {speedup / workers:10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""In-memory stand-in for the MongoDB collections used by the services.
+
+Implements only the calls the recognition / attendance path makes, with the
+same semantics for upserts against the unique attendance key, so benchmarks
+run without a server:
+
+    Database.db = MemoryDatabase()
+"""
+import itertools
+from bson import ObjectId
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        value = doc.get(key)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$exists" in condition and (key in doc) != condition["$exists"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    include = {k for k, v in projection.items() if v}
+    if include:
+        result = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {k: v for k, v in doc.items() if k not in projection}
+
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class MemoryCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self._order = itertools.count()
+
+    def create_index(self, keys, **kwargs):
+        return kwargs.get("name", "index")
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+    def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.docs[doc["_id"]] = doc
+        return _Result(inserted_id=doc["_id"])
+
+    def insert_many(self, docs):
+        return _Result(inserted_ids=[self.insert_one(doc).inserted_id for doc in docs])
+
+    def find(self, query=None, projection=None):
+        return [_project(doc, projection) for doc in self.docs.values() if _matches(doc, query or {})]
+
+    def find_one(self, query=None, projection=None):
+        found = self.find(query, projection)
+        return found[0] if found else None
+
+    def update_many(self, query, update):
+        modified = 0
+        for doc in self.docs.values():
+            if _matches(doc, query):
+                doc.update(update.get("$set", {}))
+                modified += 1
+        return _Result(modified_count=modified)
+
+    def bulk_write(self, requests, ordered=True):
+        """UpdateOne upserts with $setOnInsert, as AttendanceService issues them"""
+        upserted = {}
+        for i, request in enumerate(requests):
+            if self.find_one(request._filter) is not None or not request._upsert:
+                continue
+            doc = dict(request._filter, **request._doc.get("$setOnInsert", {}))
+            upserted[i] = self.insert_one(doc).inserted_id
+        return _Result(upserted_ids=upserted)
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(name)
+        return self.collections[name]
@@ -1,6 +1,12 @@
+import asyncio
+import functools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
 
 # Load environment variables
 load_dotenv()
@@ -11,6 +17,16 @@ class Config:
     # MongoDB Configuration
     MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
     DATABASE_NAME = os.getenv("DATABASE_NAME", "face_recognition_db")
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))  # wait for a free connection
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")  # e.g. secondaryPreferred
+    MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "1")  # number of nodes or "majority"
+    # Threads running blocking pymongo calls for async handlers (<= pool size)
+    DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
     USERS_COLLECTION = "users"
     ATTENDANCE_COLLECTION = "attendance"
 
@@ -24,6 +40,67 @@ class Config:
     FACE_MATCH_THRESHOLD = 0.6
     NUM_IMAGES_FOR_REGISTRATION = 10
 
+    # Gallery sync between workers: "auto" (change stream, else polling), "poll" or "off"
+    GALLERY_SYNC_MODE = os.getenv("GALLERY_SYNC_MODE", "auto")
+    GALLERY_POLL_INTERVAL = float(os.getenv("GALLERY_POLL_INTERVAL", "5"))
+    # Directory of memory-mapped gallery snapshots shared by workers (empty = disabled)
+    GALLERY_SNAPSHOT_DIR = os.getenv("GALLERY_SNAPSHOT_DIR", "")
+
+    # Gallery search backend: "flat" (exact brute force), "centroid" (exact, per-user
+    # centroid prefilter) or "ivf" (approximate, exact re-rank)
+    GALLERY_INDEX = os.getenv("GALLERY_INDEX", "flat")
+    CENTROID_TOP_K = int(os.getenv("CENTROID_TOP_K", "4"))
+    IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = 4 * sqrt(number of encodings)
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))  # more cells = higher recall, slower
+    IVF_MIN_ROWS = int(os.getenv("IVF_MIN_ROWS", "20000"))
+
+    # Face detection: run HOG on a frame downscaled by DETECTION_SCALE (boxes are mapped
+    # back and encoded at full resolution); DETECTION_UPSAMPLE helps with small faces
+    DETECTION_SCALE = float(os.getenv("DETECTION_SCALE", "1.0"))
+    DETECTION_UPSAMPLE = int(os.getenv("DETECTION_UPSAMPLE", "1"))
+    DETECTION_MODEL = os.getenv("DETECTION_MODEL", "hog")
+    # Recognition frames are JPEG-decoded at 1/N size (1, 2, 4, 8) and faces are then also
+    # encoded at that size, so N > 1 is opt-in. "auto" picks the largest N that DETECTION_SCALE
+    # allows. Registration images are always decoded at full size.
+    DECODE_REDUCTION = os.getenv("DECODE_REDUCTION", "1")
+
+    # Face tracking across consecutive frames of a kiosk session: identified faces whose
+    # box overlaps their track skip re-encoding for up to TRACK_REENCODE_EVERY frames
+    TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.5"))
+    TRACK_TTL = float(os.getenv("TRACK_TTL", "5"))  # seconds a track survives unseen
+    # Identities are only reused from the previous frame, if it is at most this many seconds old
+    TRACK_MAX_GAP = float(os.getenv("TRACK_MAX_GAP", "1"))
+    TRACK_REENCODE_EVERY = int(os.getenv("TRACK_REENCODE_EVERY", "5"))
+    TRACK_MIN_CONFIDENCE = float(os.getenv("TRACK_MIN_CONFIDENCE", "0.65"))
+    TRACK_SESSION_TTL = float(os.getenv("TRACK_SESSION_TTL", "300"))
+    TRACK_MAX_SESSIONS = int(os.getenv("TRACK_MAX_SESSIONS", "1000"))  # least recently used dropped beyond this
+
+    # Worker processes for face detection/encoding (0 = one per CPU core)
+    RECOGNITION_WORKERS = int(os.getenv("RECOGNITION_WORKERS", "0"))
+    RECOGNITION_QUEUE_SIZE = int(os.getenv("RECOGNITION_QUEUE_SIZE", "8"))  # extra jobs allowed to wait
+    RECOGNITION_TIMEOUT = float(os.getenv("RECOGNITION_TIMEOUT", "15"))  # seconds per job
+    # Unix socket of a shared recognition server (scripts/recognition_server.py), in a directory
+    # only this user can access; empty = in-process pool
+    RECOGNITION_SOCKET = os.getenv("RECOGNITION_SOCKET", "")
+    # Required with RECOGNITION_SOCKET: jobs are pickled, so only holders of this secret may connect
+    RECOGNITION_AUTHKEY = os.getenv("RECOGNITION_AUTHKEY", "")
+    # Shared-memory frame slots for handing images to the workers; 0 bytes = pickle them instead
+    FRAME_SLOT_BYTES = int(os.getenv("FRAME_SLOT_BYTES", str(2 * 1024 * 1024)))
+    FRAME_SLOTS = int(os.getenv("FRAME_SLOTS", "0"))  # 0 = one per pending job
+    API_WORKERS = int(os.getenv("API_WORKERS", "1"))  # uvicorn processes when run via app.py
+
+    # Background upload of attendance snapshots
+    UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+    UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "100"))
+    UPLOAD_RETRIES = int(os.getenv("UPLOAD_RETRIES", "3"))
+    UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", "1"))  # seconds, doubled per retry
+
+    # Dashboard statistics are recomputed at most once per TTL
+    STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "10"))
+    # Warm duplicate-check sets are reloaded after this many seconds so deletes
+    # made through another API worker show up; 0 keeps them until the shift closes
+    MARKED_CACHE_TTL = float(os.getenv("MARKED_CACHE_TTL", "5"))
+
     # Shift configuration
     SHIFTS = {
         1: {"name": "Ca 1", "start": "06:00", "end": "09:00"},
@@ -35,18 +112,179 @@ class Config:
     # Allowed weekdays (Monday=0, Tuesday=1, ..., Sunday=6)
     ALLOWED_WEEKDAYS = [0,  2, 4]  # Monday, Wednesday, Friday
 
+    # Recognition is only admitted inside a shift's window, widened by these grace periods
+    SHIFT_WINDOW_ENFORCED = os.getenv("SHIFT_WINDOW_ENFORCED", "true").lower() in ("1", "true", "yes")
+    SHIFT_EARLY_GRACE_MINUTES = int(os.getenv("SHIFT_EARLY_GRACE_MINUTES", "15"))
+    SHIFT_LATE_GRACE_MINUTES = int(os.getenv("SHIFT_LATE_GRACE_MINUTES", "15"))
+    # Site holidays: comma-separated YYYY-MM-DD dates and/or a file with one date per line
+    HOLIDAYS = os.getenv("HOLIDAYS", "")
+    HOLIDAYS_FILE = os.getenv("HOLIDAYS_FILE", "")
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters collected from pymongo monitoring events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.cleared = 0
+        self._waiting = {}
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.open,
+                "in_use": self.in_use,
+                "waiting": len(self._waiting),
+                "created": self.created,
+                "closed": self.closed,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "cleared": self.cleared,
+                "avg_wait_ms": round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.wait_ms_max, 3)
+            }
+
+    def _record_wait(self):
+        started = self._waiting.pop(threading.get_ident(), None)
+        if started is not None:
+            wait_ms = (time.perf_counter() - started) * 1000
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+            self.closed += 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._waiting[threading.get_ident()] = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._waiting.pop(threading.get_ident(), None)
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._record_wait()
+            self.checkouts += 1
+            self.in_use += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
 class Database:
     client = None
     db = None
+    pool_metrics = PoolMetrics()
+    _executor = None
+    _executor_lock = threading.Lock()
+    in_flight = 0
 
     @classmethod
     def connect(cls):
+        """Create the pooled client and check that a server is reachable.
+
+        A failed check is logged but the client is kept: pymongo reconnects
+        on its own once the server is back.
+        """
+        write_concern = Config.MONGO_WRITE_CONCERN
         try:
-            cls.client = MongoClient(Config.MONGODB_URI)
+            cls.client = MongoClient(
+                Config.MONGODB_URI,
+                maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=Config.MONGO_SOCKET_TIMEOUT_MS,
+                serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                readPreference=Config.MONGO_READ_PREFERENCE,
+                w=int(write_concern) if write_concern.isdigit() else write_concern,
+                event_listeners=[cls.pool_metrics]
+            )
             cls.db = cls.client[Config.DATABASE_NAME]
-            print(f"✓ Connected to MongoDB: {Config.DATABASE_NAME}")
         except Exception as e:
+            print(f"✗ MongoDB configuration error: {e}")
+            return False
+
+        try:
+            cls.client.admin.command("ping")
+            print(f"✓ Connected to MongoDB: {Config.DATABASE_NAME} "
+                  f"(pool {Config.MONGO_MIN_POOL_SIZE}-{Config.MONGO_MAX_POOL_SIZE})")
+            return True
+        except PyMongoError as e:
             print(f"✗ MongoDB connection error: {e}")
+            return False
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=Config.DB_EXECUTOR_WORKERS,
+                    thread_name_prefix="db"
+                )
+            return cls._executor
+
+    @classmethod
+    async def run(cls, fn, *args, **kwargs):
+        """Run a blocking pymongo call on the bounded DB thread pool so a slow
+        query never stalls the event loop"""
+        cls.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                cls._get_executor(), functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            cls.in_flight -= 1
+
+    @classmethod
+    def metrics(cls):
+        """Connection pool and DB executor counters"""
+        return {
+            "pool": cls.pool_metrics.snapshot(),
+            "max_pool_size": Config.MONGO_MAX_POOL_SIZE,
+            "executor_workers": Config.DB_EXECUTOR_WORKERS,
+            "executor_calls_in_flight": cls.in_flight
+        }
+
+    @classmethod
+    def close(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False)
+            cls._executor = None
+        if cls.client is not None:
+            cls.client.close()
 
     @classmethod
     def get_users_collection(cls):
@@ -55,6 +293,3 @@ class Database:
     @classmethod
     def get_attendance_collection(cls):
         return cls.db[Config.ATTENDANCE_COLLECTION] if cls.db is not None else None
-
-# Initialize DB connect
-Database.connect()
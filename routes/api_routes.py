@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
-from datetime import datetime
 from config import Config, Database
+from services.schedule import Schedule
+from services.stats_service import StatsService
+from services.startup import Startup
 
 router = APIRouter()
 
@@ -18,36 +20,26 @@ async def get_allowed_days():
         "description": "0=Monday, 2=Wednesday, 4=Friday (Thu 2, Thu 4, Thu 6)"
     })
 
+@router.get("/schedule/now")
+async def get_schedule_now():
+    """Shift open for attendance right now and the next opening"""
+    return JSONResponse(content=Schedule.current(), headers={"Cache-Control": "max-age=30"})
+
+@router.get("/ready")
+async def get_ready():
+    """Readiness probe: 200 once startup warm-up has finished, 503 before"""
+    status = Startup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@router.get("/db/pool")
+async def get_db_pool():
+    """MongoDB connection pool and DB executor metrics"""
+    return JSONResponse(content=Database.metrics())
+
 @router.get("/stats")
 async def get_stats():
-    """Get system statistics"""
+    """Get system statistics (cached, see StatsService)"""
     try:
-        users_collection = Database.get_users_collection()
-        attendance_collection = Database.get_attendance_collection()
-        
-        total_users = users_collection.count_documents({}) if users_collection is not None else 0
-        
-        today = datetime.now().date().isoformat()
-        
-        if attendance_collection is not None:
-            today_attendance = attendance_collection.count_documents({"date": today})
-            
-            shift_counts = {}
-            for shift_id in Config.SHIFTS:
-                count = attendance_collection.count_documents({
-                    "date": today,
-                    "shift": shift_id
-                })
-                shift_counts[f"shift_{shift_id}"] = count
-        else:
-            today_attendance = 0
-            shift_counts = {f"shift_{shift_id}": 0 for shift_id in Config.SHIFTS}
-            
-        return JSONResponse(content={
-            "total_users": total_users,
-            "today_attendance": today_attendance,
-            "shift_counts": shift_counts,
-            "today": today
-        })
+        return JSONResponse(content=await Database.run(StatsService.get))
     except Exception as e:
         return JSONResponse(status_code=500, content={"detail": f"Lỗi lấy thống kê: {str(e)}"})
@@ -1,38 +1,72 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
+import asyncio
+import csv
+import io
+import json
+from typing import Optional
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
 from datetime import datetime
 from bson import ObjectId
 from config import Config, Database
-from services.face_recognition import FaceRecognitionService
 from services.attendance_service import AttendanceService
-from services.cloudinary_service import CloudinaryService
+from services.attendance_cache import MarkedCache
+from services.stats_service import StatsService
+from services.recognition_pipeline import RecognitionPipeline
+from services.face_tracker import FaceTracker
+from services.face_gallery import FaceGallery
+from services.schedule import Schedule, ScheduleRejected
+from services.worker_pool import PoolSaturatedError
 
 router = APIRouter()
 
-THRESHOLD = 0.6
+def _check_schedule(date, shift):
+    """Reject requests outside the attendance schedule (no image work done yet)"""
+    try:
+        Schedule.check(date, shift)
+    except ScheduleRejected as e:
+        # Holidays and closed shifts are valid requests made at the wrong time
+        status_code = 403 if e.reason in ("holiday", "closed") else 400
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+        raise HTTPException(status_code=status_code, detail=e.detail, headers=headers)
+
+def _check_session(date, shift):
+    """Validate the attendance date/shift of a recognition request"""
+    _check_schedule(date, shift)
+
+    if not FaceGallery.loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="Hệ thống đang khởi động, vui lòng thử lại sau",
+            headers={"Retry-After": "2"}
+        )
 
 
 @router.post("/recognize")
 async def recognize_faces(
     image: UploadFile = File(...),
     date: str = Form(...),
-    shift: int = Form(...)
+    shift: int = Form(...),
+    session_id: Optional[str] = Form(None)
 ):
     try:
 
-        if shift not in Config.SHIFTS:
-            raise HTTPException(status_code=400, detail="Ca trực không hợp lệ. Chọn từ 1-4")
-
-        if not AttendanceService.is_allowed_weekday(date):
-            weekday_name = AttendanceService.get_weekday_name(date)
-            raise HTTPException(
-                status_code=400,
-                detail=f"Không được phép điểm danh vào {weekday_name}. Chỉ được phép thứ 2, 4, 6"
-            )
+        _check_session(date, shift)
 
         image_bytes = await image.read()
+        tracker = FaceTracker.for_session(session_id) if session_id else None
 
-        face_locations, face_encodings, error = FaceRecognitionService.extract_all_faces(image_bytes)
+        try:
+            recognized_faces, error = await RecognitionPipeline.process_frame(
+                image_bytes, date, shift, tracker
+            )
+        except PoolSaturatedError:
+            raise HTTPException(
+                status_code=429,
+                detail="Máy chủ đang bận, vui lòng thử lại sau",
+                headers={"Retry-After": "1"}
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Xử lý ảnh quá thời gian cho phép")
 
         if error:
             return JSONResponse(content={
@@ -41,82 +75,6 @@ async def recognize_faces(
                 "message": error
             })
 
-        recognized_faces = []
-
-        for (top, right, bottom, left), face_encoding in zip(face_locations, face_encodings):
-
-            matched_user, distance = FaceRecognitionService.find_matching_face(face_encoding.tolist())
-
-            name = "Unknown"
-            user_id = None
-            confidence = 0.0
-            status = "unknown"
-            message = "Không nhận diện được"
-
-            if matched_user:
-
-                confidence = 1.0 - distance
-
-                # áp dụng threshold
-                if confidence >= THRESHOLD:
-
-                    name = matched_user['name']
-                    user_id = matched_user['user_id']
-
-                    if AttendanceService.check_duplicate_attendance(user_id, date, shift):
-
-                        status = "already_marked"
-                        message = f"{name} đã điểm danh ca {shift} ngày {date}"
-
-                    else:
-
-                        attendance_image_url = None
-
-                        try:
-                            await image.seek(0)
-                            file_content = await image.read()
-
-                            attendance_image_url = CloudinaryService.upload_image(
-                                file_content,
-                                "face_recognition/attendance",
-                                f"attendance_{user_id}_{date}_{shift}_{int(datetime.now().timestamp())}"
-                            )
-
-                        except Exception as e:
-                            print(f"Error uploading attendance image: {e}")
-
-                        AttendanceService.log_attendance(
-                            user_id,
-                            name,
-                            date,
-                            shift,
-                            confidence,
-                            attendance_image_url
-                        )
-
-                        status = "success"
-                        message = f"Điểm danh thành công: {name} - {Config.SHIFTS[shift]['name']}"
-
-                else:
-                    # dưới threshold -> unknown
-                    name = "Unknown"
-                    user_id = None
-                    confidence = float(confidence)
-                    status = "unknown"
-                    message = "Không nhận diện được"
-
-            recognized_faces.append({
-                "top": int(top),
-                "right": int(right),
-                "bottom": int(bottom),
-                "left": int(left),
-                "name": name,
-                "user_id": user_id,
-                "confidence": float(confidence),
-                "status": status,
-                "message": message
-            })
-
         return JSONResponse(content={
             "faces": recognized_faces,
             "date": date,
@@ -130,7 +88,108 @@ async def recognize_faces(
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Nhận diện thất bại: {str(e)}")
-    
+
+
+@router.websocket("/ws/recognize")
+async def recognize_stream(websocket: WebSocket, date: str, shift: int):
+    """Streaming recognition: the client sends binary JPEG frames and may send
+    {"date": ..., "shift": ...} text messages to switch session. Only the
+    newest frame is processed; frames that arrive while one is being
+    processed replace each other and are counted as dropped."""
+    await websocket.accept()
+    try:
+        _check_session(date, shift)
+    except (HTTPException, ValueError) as e:
+        detail = e.detail if isinstance(e, HTTPException) else "Ngày không hợp lệ"
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=1008)
+        return
+
+    session = {"date": date, "shift": shift}
+    tracker = FaceTracker()
+    latest = {"frame": None, "seq": 0, "dropped": 0}
+    frame_ready = asyncio.Event()
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes") is not None:
+                if latest["frame"] is not None:
+                    latest["dropped"] += 1
+                latest["frame"] = message["bytes"]
+                latest["seq"] += 1
+                frame_ready.set()
+            elif message.get("text"):
+                try:
+                    settings = json.loads(message["text"])
+                    new_date = settings.get("date", session["date"])
+                    new_shift = int(settings.get("shift", session["shift"]))
+                    _check_session(new_date, new_shift)
+                except HTTPException as he:
+                    await websocket.send_json({"type": "error", "detail": he.detail})
+                    continue
+                except (ValueError, TypeError, AttributeError):
+                    await websocket.send_json({"type": "error", "detail": "Tin nhắn không hợp lệ"})
+                    continue
+                session.update(date=new_date, shift=new_shift)
+                await websocket.send_json({"type": "session", **session})
+
+    async def process_frames():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            frame, latest["frame"] = latest["frame"], None
+            seq, dropped = latest["seq"], latest["dropped"]
+            date, shift = session["date"], session["shift"]
+
+            try:
+                # A stream left open past the end of its shift stops here
+                _check_schedule(date, shift)
+            except HTTPException as he:
+                await websocket.send_json({"type": "closed", "frame": seq, "detail": he.detail})
+                await websocket.close(code=1008)
+                return
+
+            try:
+                faces, error = await RecognitionPipeline.process_frame(frame, date, shift, tracker)
+            except PoolSaturatedError:
+                await websocket.send_json({"type": "busy", "frame": seq})
+                continue
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "error", "frame": seq, "detail": "Xử lý ảnh quá thời gian cho phép"})
+                continue
+            except Exception as e:
+                # Fail only this frame (worker crash, database timeout...), like the HTTP path
+                print(f"Recognition stream frame {seq} failed: {e}")
+                await websocket.send_json({"type": "error", "frame": seq, "detail": f"Nhận diện thất bại: {str(e)}"})
+                continue
+
+            await websocket.send_json({
+                "type": "result",
+                "frame": seq,
+                "dropped": dropped,
+                "faces": faces,
+                "message": error,
+                "date": date,
+                "shift": shift,
+                "shift_name": Config.SHIFTS[shift]["name"],
+                "timestamp": datetime.now().isoformat()
+            })
+
+    receiver = asyncio.create_task(receive_frames())
+    processor = asyncio.create_task(process_frames())
+    try:
+        done, _ = await asyncio.wait({receiver, processor}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None \
+                    and not isinstance(task.exception(), WebSocketDisconnect):
+                print(f"Recognition stream error: {task.exception()}")
+    finally:
+        receiver.cancel()
+        processor.cancel()
+
 # @router.post("/recognize")
 # async def recognize_faces(
 #     image: UploadFile = File(...),
@@ -219,41 +278,115 @@ async def recognize_faces(
 #     except Exception as e:
 #         raise HTTPException(status_code=500, detail=f"Nhận diện thất bại: {str(e)}")
 
+EXPORT_FIELDS = ["id", "user_id", "name", "date", "shift", "shift_name", "timestamp", "confidence", "image_url"]
+MAX_PAGE_SIZE = 1000
+
+def _record_to_dict(record):
+    return {
+        "id": str(record['_id']),
+        "user_id": record['user_id'],
+        "name": record['name'],
+        "date": record.get('date', record.get('timestamp', '')[:10]),
+        "shift": record.get('shift', 0),
+        "shift_name": record.get('shift_name', 'N/A'),
+        "timestamp": record['timestamp'],
+        "confidence": record.get('confidence', 0.0),
+        "image_url": record.get('image_url')
+    }
+
+def _history_query(date, shift, user_id, date_from, date_to, cursor=None):
+    try:
+        return AttendanceService.build_query(date, shift, user_id, date_from, date_to, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+
 @router.get("/attendance")
-async def get_attendance(limit: int = 100, date: str = None, shift: int = None):
+async def get_attendance(
+    limit: int = 100,
+    date: str = None,
+    shift: int = None,
+    user_id: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    cursor: str = None
+):
+    """One page of attendance history, newest first.
+
+    Pass the returned ``next_cursor`` as ``cursor`` to get the following page;
+    it is None on the last page.
+    """
     try:
         attendance_collection = Database.get_attendance_collection()
-        query = {}
-        if date:
-            query["date"] = date
-        if shift:
-            query["shift"] = shift
-            
-        records = list(attendance_collection.find(query).sort("timestamp", -1).limit(limit))
-        
-        attendance_list = []
-        for record in records:
-            attendance_list.append({
-                "id": str(record['_id']),
-                "user_id": record['user_id'],
-                "name": record['name'],
-                "date": record.get('date', record.get('timestamp', '')[:10]),
-                "shift": record.get('shift', 0),
-                "shift_name": record.get('shift_name', 'N/A'),
-                "timestamp": record['timestamp'],
-                "confidence": record.get('confidence', 0.0),
-                "image_url": record.get('image_url')
-            })
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = _history_query(date, shift, user_id, date_from, date_to, cursor)
+
+        # One extra record tells whether another page exists
+        records = await Database.run(
+            lambda: list(AttendanceService.find_records(query, limit + 1, batch_size=limit + 1))
+        )
+        next_cursor = AttendanceService.encode_cursor(records[limit - 1]) if len(records) > limit else None
+
+        attendance_list = [_record_to_dict(record) for record in records[:limit]]
             
-        return JSONResponse(content={"attendance": attendance_list})
+        return JSONResponse(content={"attendance": attendance_list, "next_cursor": next_cursor})
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi lấy dữ liệu điểm danh: {str(e)}")
 
+@router.get("/attendance/export")
+async def export_attendance(
+    format: str = "csv",
+    date: str = None,
+    shift: int = None,
+    user_id: str = None,
+    date_from: str = None,
+    date_to: str = None
+):
+    """Stream every matching record as CSV or NDJSON with constant memory"""
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Định dạng không hợp lệ. Chọn csv hoặc ndjson")
+    if Database.get_attendance_collection() is None:
+        raise HTTPException(status_code=503, detail="Chưa kết nối cơ sở dữ liệu")
+
+    query = _history_query(date, shift, user_id, date_from, date_to)
+
+    def rows():
+        # Sync generator: Starlette iterates it in a worker thread
+        records = AttendanceService.find_records(query)
+        try:
+            if format == "csv":
+                buffer = io.StringIO()
+                buffer.write("\ufeff")  # BOM so spreadsheet apps read Vietnamese names as UTF-8
+                writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+                writer.writeheader()
+                for record in records:
+                    writer.writerow(_record_to_dict(record))
+                    if buffer.tell() >= 64 * 1024:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                yield buffer.getvalue()
+            else:
+                for record in records:
+                    yield json.dumps(_record_to_dict(record), ensure_ascii=False) + "\n"
+        finally:
+            records.close()
+
+    suffix = date or "_".join(filter(None, [date_from, date_to])) or "all"
+    return StreamingResponse(
+        rows(),
+        media_type="text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="attendance_{suffix}.{format}"'}
+    )
+
 @router.delete("/attendance/all")
 async def delete_all_attendance():
     try:
         attendance_collection = Database.get_attendance_collection()
-        result = attendance_collection.delete_many({})
+        result = await Database.run(attendance_collection.delete_many, {})
+        MarkedCache.invalidate()
+        StatsService.invalidate()
         return JSONResponse(content={
             "success": True, 
             "message": f"Đã xóa toàn bộ {result.deleted_count} bản ghi điểm danh"
@@ -265,10 +398,17 @@ async def delete_all_attendance():
 async def delete_attendance_record(record_id: str):
     try:
         attendance_collection = Database.get_attendance_collection()
-        result = attendance_collection.delete_one({"_id": ObjectId(record_id)})
+        record = await Database.run(
+            attendance_collection.find_one_and_delete,
+            {"_id": ObjectId(record_id)},
+            projection={"date": 1, "shift": 1}
+        )
         
-        if result.deleted_count == 0:
+        if record is None:
             raise HTTPException(status_code=404, detail="Không tìm thấy bản ghi")
+
+        MarkedCache.invalidate(record.get("date"), record.get("shift"))
+        StatsService.record_attendance(record.get("date"), record.get("shift"), -1)
             
         return JSONResponse(content={
             "success": True, 
@@ -1,49 +1,113 @@
-from fastapi import APIRouter, Form, HTTPException
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from fastapi.responses import JSONResponse
+from typing import List, Optional
+import asyncio
 import json
 import base64
+import time
 from datetime import datetime
 from config import Database, Config
 from services.face_recognition import FaceRecognitionService
 from services.cloudinary_service import CloudinaryService
+from services.face_gallery import FaceGallery
+from services.encoding_codec import EncodingCodec
+from services.worker_pool import RecognitionPool, PoolSaturatedError
 
 router = APIRouter()
 
+async def _image_bytes(image):
+    """Raw bytes of a multipart file or a (data URL) base64 string"""
+    if isinstance(image, str):
+        if ',' in image:
+            image = image.split(',')[1]
+        return base64.b64decode(image)
+    await image.seek(0)
+    return await image.read()
+
+async def _encode_images(image_list, target):
+    """Encode registration images in parallel on the recognition pool.
+
+    At most one job per pool worker runs for this request, and no new job is
+    started once ``target`` valid encodings exist. Returns the encodings in
+    image order and a per-image status/timing list. Images are multipart
+    files or base64 strings and are only read once their job starts.
+    """
+    details = [{"index": i + 1, "status": "skipped", "elapsed_ms": 0.0} for i in range(len(image_list))]
+    encodings = {}
+    limit = asyncio.Semaphore(max(1, RecognitionPool.workers))
+    enough = asyncio.Event()
+
+    async def encode(i, image):
+        async with limit:
+            if enough.is_set():
+                return
+            started = time.perf_counter()
+            try:
+                image_bytes = await _image_bytes(image)
+                encoding, error = await RecognitionPool.run_frame(
+                    FaceRecognitionService.encode_face_from_image, image_bytes
+                )
+            except PoolSaturatedError:
+                raise
+            except asyncio.TimeoutError:
+                encoding, error = None, "Timeout"
+            except Exception as e:
+                encoding, error = None, str(e)
+                print(f"Image {i+1} error: {e}")
+
+            details[i]["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            if encoding:
+                encodings[i] = encoding
+                details[i]["status"] = "ok"
+                if len(encodings) >= target:
+                    enough.set()
+            else:
+                details[i]["status"] = "failed"
+                details[i]["error"] = error
+
+    tasks = [asyncio.create_task(encode(i, img)) for i, img in enumerate(image_list)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return [encodings[i] for i in sorted(encodings)], details
+
 @router.post("/register")
 async def register_user(
     name: str = Form(...),
     user_id: str = Form(...),
-    images: str = Form(...) 
+    images: Optional[str] = Form(None),
+    files: List[UploadFile] = File(None)
 ):
+    """Register a user from raw image files (``files``, preferred) or a JSON
+    list of base64 data URLs (``images``)"""
     try:
         users_collection = Database.get_users_collection()
-        image_list = json.loads(images)
+        image_list = list(files or []) or (json.loads(images) if images else [])
         
         if len(image_list) < 5:
             raise HTTPException(status_code=400, detail="Cần ít nhất 5 ảnh để đăng ký")
             
-        existing_user = users_collection.find_one({"user_id": user_id})
+        existing_user = await Database.run(users_collection.find_one, {"user_id": user_id})
         if existing_user:
             raise HTTPException(status_code=400, detail="Mã số người dùng đã tồn tại")
 
-        face_encodings = []
-        failed_count = 0
-            
-        for i, img_base64 in enumerate(image_list):
-            try:
-                if ',' in img_base64:
-                    img_base64 = img_base64.split(',')[1]
-                
-                image_bytes = base64.b64decode(img_base64)
-                encoding, error = FaceRecognitionService.encode_face_from_image(image_bytes)
-                
-                if encoding:
-                    face_encodings.append(encoding)
-                else:
-                    failed_count += 1
-            except Exception as e:
-                failed_count += 1
-                print(f"Image {i+1} error: {e}")
+        started = time.perf_counter()
+        try:
+            face_encodings, image_details = await _encode_images(
+                image_list, Config.NUM_IMAGES_FOR_REGISTRATION
+            )
+        except PoolSaturatedError:
+            raise HTTPException(
+                status_code=429,
+                detail="Máy chủ đang bận, vui lòng thử lại sau",
+                headers={"Retry-After": "1"}
+            )
+        encode_ms = round((time.perf_counter() - started) * 1000, 1)
+        failed_count = sum(1 for d in image_details if d["status"] == "failed")
                 
         if len(face_encodings) < 5:
             raise HTTPException(
@@ -53,11 +117,7 @@ async def register_user(
             
         image_url = None
         try:
-            first_img_base64 = image_list[0]
-            if ',' in first_img_base64:
-                first_img_base64 = first_img_base64.split(',')[1]
-                
-            image_bytes = base64.b64decode(first_img_base64)
+            image_bytes = await _image_bytes(image_list[0])
             image_url = CloudinaryService.upload_image(
                 image_bytes, 
                 "face_recognition/users", 
@@ -69,20 +129,24 @@ async def register_user(
         user_doc = {
             "name": name,
             "user_id": user_id,
-            "face_encodings": face_encodings,
+            "face_encodings": EncodingCodec.pack(face_encodings),
             "num_encodings": len(face_encodings),
             "image_url": image_url,
             "registered_at": datetime.now().isoformat()
         }
         
-        users_collection.insert_one(user_doc)
+        await Database.run(users_collection.insert_one, user_doc)
+        # Growing the gallery may compact or reindex it; keep that off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, FaceGallery.add_user, user_doc)
         
         return JSONResponse(content={
             "success": True,
             "message": f"Đăng ký thành công cho {name} với {len(face_encodings)} ảnh",
             "user_id": user_id,
             "image_url": image_url,
-            "num_encodings": len(face_encodings)
+            "num_encodings": len(face_encodings),
+            "encode_ms": encode_ms,
+            "images": image_details
         })
     except HTTPException as he:
         raise he
@@ -93,7 +157,9 @@ async def register_user(
 async def get_users():
     try:
         users_collection = Database.get_users_collection()
-        users = list(users_collection.find({}, {"face_encodings": 0, "face_encoding": 0}))
+        users = await Database.run(
+            lambda: list(users_collection.find({}, {"face_encodings": 0, "face_encoding": 0}))
+        )
         
         user_list = []
         for user in users:
@@ -114,10 +180,12 @@ async def get_users():
 async def delete_user(user_id: str):
     try:
         users_collection = Database.get_users_collection()
-        result = users_collection.delete_one({"user_id": user_id})
+        result = await Database.run(users_collection.delete_one, {"user_id": user_id})
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Không tìm thấy người dùng")
+
+        await asyncio.get_running_loop().run_in_executor(None, FaceGallery.remove_user, user_id)
             
         return JSONResponse(content={
             "success": True,
@@ -0,0 +1,27 @@
+"""Export the face gallery from MongoDB to a memory-mappable snapshot.
+
+Workers started with GALLERY_SNAPSHOT_DIR map the newest snapshot instead of
+reading every user document, then catch up on later changes. Re-run it
+periodically (e.g. nightly) to keep that catch-up small:
+
+    python -m scripts.gallery_snapshot --dir ./gallery_snapshot
+"""
+import argparse
+from config import Config, Database
+from services.face_gallery import FaceGallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default=Config.GALLERY_SNAPSHOT_DIR or "gallery_snapshot",
+                        help="Snapshot directory (default: GALLERY_SNAPSHOT_DIR)")
+    args = parser.parse_args()
+
+    Database.connect()
+    if not FaceGallery.load():
+        raise SystemExit("MongoDB is not connected")
+    FaceGallery.save_snapshot(args.dir)
+
+
+if __name__ == "__main__":
+    main()
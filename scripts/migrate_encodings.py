@@ -0,0 +1,102 @@
+"""Convert stored face encodings to the packed float32 format (EncodingCodec).
+
+Legacy ``face_encodings`` lists and single ``face_encoding`` vectors are
+rewritten as one ``face_encodings`` blob; already packed users are skipped
+(only a leftover ``face_encoding`` is removed), so the command can be re-run
+safely:
+
+    python -m scripts.migrate_encodings --dry-run
+    python -m scripts.migrate_encodings --batch-size 500
+"""
+import argparse
+from pymongo import UpdateOne
+from config import Database
+from services.encoding_codec import EncodingCodec
+from services.face_gallery import ENCODING_DIM
+
+
+def legacy_users(users_collection):
+    """Users whose encodings are still stored as BSON arrays"""
+    return users_collection.find(
+        {"$or": [
+            {"face_encodings": {"$type": "array"}},
+            {"face_encoding": {"$exists": True}}
+        ]},
+        {"face_encodings": 1, "face_encoding": 1}
+    )
+
+
+def migration_update(user):
+    """Update document for one legacy user, or None if it has no usable encodings.
+
+    A packed ``face_encodings`` blob is never rewritten: it may hold several
+    encodings, while a leftover ``face_encoding`` is a single stale vector.
+    """
+    stored = user.get("face_encodings")
+    if EncodingCodec.is_packed(stored):
+        return {"$unset": {"face_encoding": ""}}
+    encodings = EncodingCodec.unpack(stored, ENCODING_DIM)
+    if encodings is None:
+        encodings = EncodingCodec.unpack(user.get("face_encoding"), ENCODING_DIM)
+    if encodings is None:
+        return None
+    return {
+        "$set": {
+            "face_encodings": EncodingCodec.pack(encodings),
+            "num_encodings": len(encodings)
+        },
+        "$unset": {"face_encoding": ""}
+    }
+
+
+def migrate(users_collection, batch_size=500, dry_run=False):
+    """Rewrite legacy users in bulk batches; returns (converted, cleaned, skipped)"""
+    converted = cleaned = skipped = 0
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            users_collection.bulk_write(batch, ordered=False)
+        batch.clear()
+
+    for user in legacy_users(users_collection):
+        update = migration_update(user)
+        if update is None:
+            skipped += 1
+            continue
+
+        batch.append(UpdateOne({"_id": user["_id"]}, update))
+        if "$set" in update:
+            converted += 1
+        else:
+            cleaned += 1
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return converted, cleaned, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the users to convert")
+    args = parser.parse_args()
+
+    Database.connect()
+    users_collection = Database.get_users_collection()
+    if users_collection is None:
+        raise SystemExit("MongoDB is not connected")
+
+    before = users_collection.database.command("collStats", users_collection.name).get("size")
+    converted, cleaned, skipped = migrate(users_collection, args.batch_size, args.dry_run)
+    action = "Would convert" if args.dry_run else "Converted"
+    print(f"✓ {action} {converted} users, dropped a stale face_encoding from {cleaned} already packed "
+          f"({skipped} without usable encodings left untouched)")
+
+    if not args.dry_run and before:
+        after = users_collection.database.command("collStats", users_collection.name).get("size")
+        print(f"  users collection: {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Run the shared recognition workers for multi-process deployments.
+
+Starts one supervised worker process per core (RECOGNITION_WORKERS) that
+loads the dlib models once and serves detection / encoding jobs for every
+API process connected to the Unix socket. Start it before the API, with
+the same RECOGNITION_AUTHKEY and RECOGNITION_SOCKET in both environments:
+
+    export RECOGNITION_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(32))")
+    export RECOGNITION_SOCKET=$HOME/.face-recognition/recognition.sock
+    python -m scripts.recognition_server
+    API_WORKERS=4 python app.py
+"""
+import argparse
+import signal
+from config import Config
+from services.recognition_server import RecognitionServer, default_socket_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=Config.RECOGNITION_SOCKET or default_socket_path(),
+                        help="Unix socket path in a private directory (default: RECOGNITION_SOCKET)")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: one per core)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Jobs allowed to wait beyond one per worker (default: RECOGNITION_QUEUE_SIZE)")
+    args = parser.parse_args()
+
+    try:
+        server = RecognitionServer(args.socket, args.workers or None, args.queue_size)
+        signal.signal(signal.SIGTERM, lambda *_: server.stop())
+        server.serve_forever()
+    except RuntimeError as e:
+        raise SystemExit(f"✗ {e}")
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
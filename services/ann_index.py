@@ -0,0 +1,109 @@
+import numpy as np
+
+ASSIGN_CHUNK_BYTES = 32 << 20  # score matrix budget per chunk
+
+
+def _nearest_centroids(vectors, centroids, centroid_sq, k=1):
+    """Return the indices of the k closest centroids for each vector"""
+    result = np.empty((len(vectors), k), dtype=np.int32)
+    dtype = np.result_type(vectors, centroids)
+    chunk_rows = max(1, ASSIGN_CHUNK_BYTES // (dtype.itemsize * len(centroids)))
+    buffer = np.empty((min(chunk_rows, len(vectors)), len(centroids)), dtype=dtype)
+    for start in range(0, len(vectors), chunk_rows):
+        chunk = vectors[start:start + chunk_rows]
+        # ||c||^2 - 2 v.c ranks centroids exactly like ||v - c||^2, computed in place
+        scores = buffer[:len(chunk)]
+        np.matmul(chunk, centroids.T, out=scores)
+        scores *= -2
+        scores += centroid_sq
+        if k == 1:
+            result[start:start + len(chunk), 0] = np.argmin(scores, axis=1)
+        else:
+            top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+            result[start:start + len(chunk)] = top
+    return result
+
+
+class IVFIndex:
+    """Inverted-file index over the gallery rows.
+
+    Encodings are clustered with k-means into ``nlist`` cells and each row is
+    filed under its closest centroid. A query only visits the ``nprobe``
+    closest cells, so ``nprobe`` trades recall for latency. The index only
+    proposes candidate rows; the gallery computes exact distances on them,
+    which keeps ``FACE_MATCH_THRESHOLD`` semantics intact.
+    """
+
+    def __init__(self, nlist, nprobe, train_iters=8, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iters = train_iters
+        self.seed = seed
+        self.centroids = None
+        self.centroid_sq = None
+        self.lists = []
+        self.trained_rows = 0
+
+    def train(self, vectors):
+        """Fit the coarse centroids with k-means on a sample of the vectors"""
+        rng = np.random.default_rng(self.seed)
+        nlist = max(1, min(self.nlist, len(vectors)))
+        sample_size = min(len(vectors), nlist * 32)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.train_iters):
+            centroid_sq = np.einsum('ij,ij->i', centroids, centroids)
+            assign = _nearest_centroids(sample, centroids, centroid_sq)[:, 0]
+            counts = np.bincount(assign, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            # Reseed empty cells on random sample points
+            if empty.any():
+                centroids[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.centroid_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.trained_rows = len(vectors)
+
+    def with_centroids(self):
+        """Empty index sharing this one's trained centroids (no retraining)"""
+        index = IVFIndex(self.nlist, self.nprobe, self.train_iters, self.seed)
+        index.centroids = self.centroids
+        index.centroid_sq = self.centroid_sq
+        index.trained_rows = self.trained_rows
+        return index
+
+    def build(self, vectors):
+        """File every row of ``vectors`` (row ids are positions) into its cell"""
+        if self.centroids is None:
+            self.train(vectors)
+        assign = _nearest_centroids(vectors, self.centroids, self.centroid_sq)[:, 0]
+        order = np.argsort(assign, kind='stable').astype(np.int64)
+        bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def add(self, start_row, vectors):
+        """File rows ``start_row .. start_row + len(vectors)`` into their cells"""
+        if self.centroids is None or len(vectors) == 0:
+            return
+        assign = _nearest_centroids(vectors, self.centroids, self.centroid_sq)[:, 0]
+        rows = np.arange(start_row, start_row + len(vectors), dtype=np.int64)
+        for cell in np.unique(assign):
+            self.lists[cell] = np.concatenate([self.lists[cell], rows[assign == cell]])
+
+    def candidates(self, queries, nprobe=None):
+        """Return the sorted, unique row ids in the cells probed by any query"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        cells = np.unique(_nearest_centroids(queries, self.centroids, self.centroid_sq, nprobe))
+        lists = self.lists
+        rows = np.concatenate([lists[c] for c in cells]) if len(cells) else np.empty(0, np.int64)
+        rows.sort()
+        return rows
+
+    def needs_retrain(self, num_rows):
+        """Centroids go stale once the gallery has grown well past the training set"""
+        return num_rows > 2 * max(self.trained_rows, 1)
@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import datetime
+from config import Database, Config
+from services.metrics import Metrics
+from services.schedule import Schedule
+
+
+class MarkedCache:
+    """In-process set of user_ids already marked per (date, shift).
+
+    A set is warmed from MongoDB the first time its (date, shift) is used and
+    then kept up to date by AttendanceService, so the duplicate check for a
+    kiosk frame is a memory lookup. Sets are evicted once Schedule stops
+    admitting the shift (late grace included); closed shifts are never cached and always read
+    from the database. The cache is per process, so warm sets are also
+    reloaded after Config.MARKED_CACHE_TTL seconds: deletes made through
+    another worker show up here within that delay. The unique attendance
+    index remains the source of truth for new records.
+    """
+    _lock = threading.Lock()
+    _marked = {}
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def _cacheable(date, shift, now):
+        closes = Schedule.closes_at(date, shift)
+        return closes is not None and now < closes
+
+    @staticmethod
+    def _load(date, shift):
+        attendance_collection = Database.get_attendance_collection()
+        if attendance_collection is None:
+            return set()
+        return {
+            doc["user_id"]
+            for doc in attendance_collection.find({"date": date, "shift": shift}, {"user_id": 1, "_id": 0})
+        }
+
+    @classmethod
+    def _evict(cls, now):
+        stale = time.monotonic() - Config.MARKED_CACHE_TTL if Config.MARKED_CACHE_TTL > 0 else None
+        for key in [
+            k for k, (loaded_at, _) in cls._marked.items()
+            if not cls._cacheable(*k, now) or (stale is not None and loaded_at < stale)
+        ]:
+            del cls._marked[key]
+
+    @classmethod
+    @Metrics.timed("duplicate_check")
+    def marked(cls, date, shift):
+        """Users already marked for this date/shift (do not mutate)"""
+        now = datetime.now()
+        key = (date, shift)
+        with cls._lock:
+            cls._evict(now)
+            if key in cls._marked:
+                cls.hits += 1
+                return cls._marked[key][1]
+        cls.misses += 1
+        loaded_at = time.monotonic()
+        marked = cls._load(date, shift)
+        if not cls._cacheable(date, shift, now):
+            return marked
+        with cls._lock:
+            # Keep a set another request warmed (and possibly updated) meanwhile
+            return cls._marked.setdefault(key, (loaded_at, marked))[1]
+
+    @classmethod
+    def is_marked(cls, user_id, date, shift):
+        return user_id in cls.marked(date, shift)
+
+    @classmethod
+    def add(cls, date, shift, user_ids):
+        """Record users as marked; only touches sets that are already warm"""
+        with cls._lock:
+            entry = cls._marked.get((date, shift))
+            if entry is not None:
+                entry[1].update(user_ids)
+
+    @classmethod
+    def invalidate(cls, date=None, shift=None):
+        """Drop one (date, shift) set, or everything when called without arguments"""
+        with cls._lock:
+            if date is None:
+                cls._marked.clear()
+            else:
+                cls._marked.pop((date, shift), None)
@@ -1,33 +1,58 @@
+import base64
+import json
 from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 from config import Database, Config
+from services.attendance_cache import MarkedCache
+from services.stats_service import StatsService
+from services.metrics import Metrics
+from services.schedule import Schedule
 
 class AttendanceService:
+    @staticmethod
+    def ensure_indexes():
+        """One attendance record per (user_id, date, shift), enforced by MongoDB,
+        plus the indexes behind statistics and history listing/export"""
+        attendance_collection = Database.get_attendance_collection()
+        if attendance_collection is None:
+            return False
+        newest_first = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+        attendance_collection.create_index(newest_first, name="timestamp_id")
+        attendance_collection.create_index([("date", ASCENDING)] + newest_first, name="date_timestamp_id")
+        attendance_collection.create_index(
+            [("date", ASCENDING), ("shift", ASCENDING)] + newest_first,
+            name="date_shift_timestamp_id"
+        )
+        attendance_collection.create_index([("user_id", ASCENDING)] + newest_first, name="user_timestamp_id")
+        try:
+            attendance_collection.create_index(
+                [("user_id", ASCENDING), ("date", ASCENDING), ("shift", ASCENDING)],
+                unique=True,
+                name="user_date_shift_unique"
+            )
+            return True
+        except OperationFailure as e:
+            # Usually pre-existing duplicate records; remove them and restart
+            print(f"✗ Could not create unique attendance index: {e}")
+            return False
+
     @staticmethod
     def is_allowed_weekday(date_str):
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        return date_obj.weekday() in Config.ALLOWED_WEEKDAYS
+        return Schedule.parse_date(date_str).weekday() in Config.ALLOWED_WEEKDAYS
 
     @staticmethod
     def get_weekday_name(date_str):
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        weekday = date_obj.weekday()
-        names = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ nhật"]
-        return names[weekday]
+        return Schedule.weekday_name(date_str)
 
     @staticmethod
     def check_duplicate_attendance(user_id, date_str, shift):
-        attendance_collection = Database.get_attendance_collection()
-        if attendance_collection is None:
-            return False
-            
-        existing = attendance_collection.find_one({
-            "user_id": user_id,
-            "date": date_str,
-            "shift": shift
-        })
-        return existing is not None
+        return MarkedCache.is_marked(user_id, date_str, shift)
 
     @staticmethod
+    @Metrics.timed("attendance_write")
     def log_attendance(user_id, name, date, shift, confidence, image_url=None):
         attendance_collection = Database.get_attendance_collection()
         if attendance_collection is None:
@@ -44,5 +69,122 @@ class AttendanceService:
             "image_url": image_url
         }
         
-        attendance_collection.insert_one(attendance_doc)
-        return True
+        result = attendance_collection.insert_one(attendance_doc)
+        MarkedCache.add(date, shift, [user_id])
+        StatsService.record_attendance(date, shift)
+        return result.inserted_id
+
+    @staticmethod
+    @Metrics.timed("attendance_write")
+    def log_attendance_batch(entries, date, shift):
+        """Record (user_id, name, confidence) entries for one frame in a single
+        unordered bulk upsert.
+
+        Returns one item per entry: the new record's _id, or None when the
+        user was already marked for this date/shift (known to MarkedCache,
+        found by the upsert or rejected by the unique index when another
+        worker won the race). Cached users never reach the database.
+        """
+        attendance_collection = Database.get_attendance_collection()
+        if attendance_collection is None:
+            return [False] * len(entries)
+
+        marked = MarkedCache.marked(date, shift)
+        pending = [i for i, (user_id, _, _) in enumerate(entries) if user_id not in marked]
+        results = [None] * len(entries)
+        if not pending:
+            return results
+
+        timestamp = datetime.now().isoformat()
+        requests = [
+            UpdateOne(
+                {"user_id": user_id, "date": date, "shift": shift},
+                {"$setOnInsert": {
+                    "name": name,
+                    "shift_name": Config.SHIFTS[shift]["name"],
+                    "timestamp": timestamp,
+                    "confidence": confidence,
+                    "image_url": None
+                }},
+                upsert=True
+            )
+            for user_id, name, confidence in (entries[i] for i in pending)
+        ]
+
+        try:
+            upserted = attendance_collection.bulk_write(requests, ordered=False).upserted_ids
+        except BulkWriteError as e:
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+            upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+
+        for j, i in enumerate(pending):
+            results[i] = upserted.get(j)
+        MarkedCache.add(date, shift, [entries[i][0] for i in pending])
+        StatsService.record_attendance(date, shift, sum(1 for r in results if r is not None))
+        return results
+
+    @staticmethod
+    def encode_cursor(record):
+        """Opaque keyset cursor pointing just after ``record``"""
+        raw = json.dumps([record["timestamp"], str(record["_id"])]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Return (timestamp, ObjectId); raises ValueError for a malformed cursor"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            timestamp, oid = json.loads(raw)
+            return str(timestamp), ObjectId(oid)
+        except (TypeError, ValueError, InvalidId) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    @staticmethod
+    def build_query(date=None, shift=None, user_id=None, date_from=None, date_to=None, cursor=None):
+        """Filter for attendance history, newest first on (timestamp, _id)"""
+        query = {}
+        if date:
+            query["date"] = date
+        elif date_from or date_to:
+            query["date"] = {}
+            if date_from:
+                query["date"]["$gte"] = date_from
+            if date_to:
+                query["date"]["$lte"] = date_to
+        if shift:
+            query["shift"] = shift
+        if user_id:
+            query["user_id"] = user_id
+        if cursor:
+            timestamp, oid = AttendanceService.decode_cursor(cursor)
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": oid}}
+            ]
+        return query
+
+    @staticmethod
+    def find_records(query, limit=None, batch_size=500):
+        """Cursor over matching records in keyset order (streamed, not materialized)"""
+        attendance_collection = Database.get_attendance_collection()
+        records = attendance_collection.find(query).sort(
+            [("timestamp", DESCENDING), ("_id", DESCENDING)]
+        ).batch_size(batch_size)
+        if limit:
+            records = records.limit(limit)
+        return records
+
+    @staticmethod
+    @Metrics.timed("image_url_update")
+    def set_image_url(record_ids, image_url):
+        """Attach an uploaded snapshot URL to attendance records"""
+        attendance_collection = Database.get_attendance_collection()
+        if attendance_collection is None or not record_ids:
+            return 0
+
+        result = attendance_collection.update_many(
+            {"_id": {"$in": list(record_ids)}},
+            {"$set": {"image_url": image_url}}
+        )
+        return result.modified_count
@@ -1,10 +1,10 @@
-import cloudinary
-import cloudinary.uploader
 from config import Config
 
 class CloudinaryService:
     @staticmethod
     def initialize():
+        # Imported here so processes that never upload don't pay for the SDK
+        import cloudinary
         cloudinary.config(
             cloud_name=Config.CLOUDINARY_CLOUD_NAME,
             api_key=Config.CLOUDINARY_API_KEY,
@@ -15,6 +15,7 @@ class CloudinaryService:
 
     @staticmethod
     def upload_image(image_bytes, folder: str, public_id: str):
+        import cloudinary.uploader
         try:
             upload_result = cloudinary.uploader.upload(
                 image_bytes,
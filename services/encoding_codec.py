@@ -0,0 +1,51 @@
+import numpy as np
+from bson.binary import Binary
+
+ENCODING_DTYPE = "<f4"
+
+
+class EncodingCodec:
+    """Compact MongoDB representation of a user's face encodings.
+
+    Encodings are stored as one little-endian float32 blob with its shape and
+    dtype: ``{"dtype": "<f4", "shape": [k, 128], "data": Binary}``. That is
+    half the size of a list of BSON doubles, and decoding is a zero-copy
+    ``np.frombuffer`` instead of a per-element float conversion. Legacy
+    documents holding plain lists are still decoded.
+    """
+
+    @staticmethod
+    def pack(encodings):
+        array = np.ascontiguousarray(encodings, dtype=ENCODING_DTYPE)
+        if array.ndim == 1:
+            array = array.reshape(1, -1)
+        return {
+            "dtype": ENCODING_DTYPE,
+            "shape": list(array.shape),
+            "data": Binary(array.tobytes())
+        }
+
+    @staticmethod
+    def is_packed(stored):
+        return isinstance(stored, dict) and "data" in stored
+
+    @staticmethod
+    def unpack(stored, dim):
+        """(k, dim) array of a packed blob or a legacy (nested) list; None if empty.
+
+        Packed data is returned as a read-only view of the document's bytes.
+        """
+        if stored is None:
+            return None
+        if EncodingCodec.is_packed(stored):
+            array = np.frombuffer(stored["data"], dtype=np.dtype(stored.get("dtype", ENCODING_DTYPE)))
+            array = array.reshape(stored.get("shape", (-1, dim)))
+            if array.dtype != np.float32:
+                array = array.astype(np.float32)
+        else:
+            if len(stored) == 0:
+                return None
+            array = np.asarray(stored, dtype=np.float32)
+        if array.size == 0:
+            return None
+        return array.reshape(-1, dim)
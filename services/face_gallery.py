@@ -0,0 +1,615 @@
+import fcntl
+import json
+import os
+import threading
+import time
+import numpy as np
+from bson import json_util
+from config import Database, Config
+from services.ann_index import IVFIndex
+from services.encoding_codec import EncodingCodec
+
+ENCODING_DIM = 128
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_ARRAYS = ("encodings", "sq_norms", "row_users", "centroids", "centroid_sq", "radii", "user_offsets")
+
+
+class FaceGallery:
+    """Process-resident matrix of every stored face encoding.
+
+    All encodings live in one contiguous float32 matrix; ``row_users`` maps
+    each row to a slot in ``users`` so a query is a single matrix-vector
+    product followed by an argmin.
+
+    Users are added and removed incrementally: new rows are appended into a
+    pre-allocated buffer and removed rows are tombstoned with an infinite
+    squared norm, so they can never win an argmin. The buffer is compacted in
+    memory once tombstones make up a large share of it. ``version`` is bumped
+    on every change.
+
+    With ``Config.GALLERY_INDEX = "ivf"`` large galleries are searched through
+    an IVFIndex: only rows in the probed cells are compared, with exact
+    distances, so thresholds behave exactly as in the brute-force scan. The
+    index is (re)built on a background thread; searches fall back to the
+    exact scan until it is swapped in.
+
+    With ``"centroid"`` every user also keeps the centroid of their encodings
+    and a radius (distance to the farthest one). By the triangle inequality
+    ``|q - c| - r`` is a lower bound on the distance to any of the user's
+    encodings, so only users whose bound beats the best exact distance found
+    among the ``CENTROID_TOP_K`` most promising users are compared in full.
+    Results are identical to the brute-force scan.
+    """
+    COMPACT_RATIO = 0.25
+    MIN_CAPACITY = 1024
+    # Absorbs float32 rounding in the centroid lower bound
+    BOUND_EPSILON = 1e-4
+
+    _lock = threading.RLock()
+    _buffer = np.empty((0, ENCODING_DIM), dtype=np.float32)
+    _sq_buffer = np.empty(0, dtype=np.float32)
+    _owner_buffer = np.empty(0, dtype=np.int32)
+    _centroid_buffer = np.empty((0, ENCODING_DIM), dtype=np.float32)
+    _centroid_sq_buffer = np.empty(0, dtype=np.float32)
+    _radius_buffer = np.empty(0, dtype=np.float32)
+    _size = 0
+    _dead_rows = 0
+    _slot_by_user_id = {}
+    _slot_by_oid = {}
+
+    encodings = _buffer
+    sq_norms = _sq_buffer
+    row_users = _owner_buffer
+    user_offsets = np.empty(0, dtype=np.int64)
+    centroids = _centroid_buffer
+    centroid_sq = _centroid_sq_buffer
+    radii = _radius_buffer
+    users = []
+    index = None
+    _index_generation = 0
+    _index_thread = None
+    version = 0
+    loaded = False
+
+    @staticmethod
+    def _user_encodings(user):
+        """Return the stored encodings of a user document as an (k, 128) array"""
+        if 'face_encodings' in user:
+            stored = user['face_encodings']
+        elif 'face_encoding' in user:
+            stored = user['face_encoding']
+        else:
+            return None
+        return EncodingCodec.unpack(stored, ENCODING_DIM)
+
+    @staticmethod
+    def _strip(user):
+        user = dict(user)
+        user.pop('face_encodings', None)
+        user.pop('face_encoding', None)
+        return user
+
+    @classmethod
+    def _publish(cls):
+        """Refresh the public views after the buffers changed (lock held)"""
+        cls.encodings = cls._buffer[:cls._size]
+        cls.sq_norms = cls._sq_buffer[:cls._size]
+        cls.row_users = cls._owner_buffer[:cls._size]
+        num_users = len(cls.user_offsets)
+        cls.centroids = cls._centroid_buffer[:num_users]
+        cls.centroid_sq = cls._centroid_sq_buffer[:num_users]
+        cls.radii = cls._radius_buffer[:num_users]
+        cls.version += 1
+
+    @staticmethod
+    def _centroid(block):
+        """Return (centroid, radius) bounding every encoding of one user"""
+        centroid = block.mean(axis=0)
+        radius = float(np.sqrt(np.einsum('ij,ij->i', block - centroid, block - centroid).max()))
+        return centroid, radius
+
+    @classmethod
+    def _set_centroid(cls, slot, block):
+        """Store a user's centroid, growing the per-user buffers if needed (lock held)"""
+        if slot >= len(cls._centroid_buffer):
+            capacity = max(2 * len(cls._centroid_buffer), slot + 1, cls.MIN_CAPACITY)
+            centroid_buffer = np.zeros((capacity, ENCODING_DIM), dtype=np.float32)
+            centroid_sq_buffer = np.zeros(capacity, dtype=np.float32)
+            radius_buffer = np.full(capacity, -np.inf, dtype=np.float32)
+            centroid_buffer[:slot] = cls._centroid_buffer[:slot]
+            centroid_sq_buffer[:slot] = cls._centroid_sq_buffer[:slot]
+            radius_buffer[:slot] = cls._radius_buffer[:slot]
+            cls._centroid_buffer = centroid_buffer
+            cls._centroid_sq_buffer = centroid_sq_buffer
+            cls._radius_buffer = radius_buffer
+        centroid, radius = cls._centroid(block)
+        cls._centroid_buffer[slot] = centroid
+        cls._centroid_sq_buffer[slot] = centroid @ centroid
+        cls._radius_buffer[slot] = radius
+
+    @classmethod
+    def _reset(cls, blocks, users, capacity):
+        """Replace the whole gallery with the given per-user blocks (lock held)"""
+        capacity = max(capacity, sum(len(b) for b in blocks), cls.MIN_CAPACITY)
+        buffer = np.empty((capacity, ENCODING_DIM), dtype=np.float32)
+        sq_buffer = np.full(capacity, np.inf, dtype=np.float32)
+        owner_buffer = np.full(capacity, -1, dtype=np.int32)
+        offsets = np.empty(len(blocks), dtype=np.int64)
+
+        row = 0
+        for slot, block in enumerate(blocks):
+            offsets[slot] = row
+            buffer[row:row + len(block)] = block
+            owner_buffer[row:row + len(block)] = slot
+            row += len(block)
+        sq_buffer[:row] = np.einsum('ij,ij->i', buffer[:row], buffer[:row])
+
+        cls._buffer, cls._sq_buffer, cls._owner_buffer = buffer, sq_buffer, owner_buffer
+        cls._size = row
+        cls._dead_rows = 0
+        user_capacity = max(2 * len(blocks), cls.MIN_CAPACITY)
+        cls._centroid_buffer = np.zeros((user_capacity, ENCODING_DIM), dtype=np.float32)
+        cls._centroid_sq_buffer = np.zeros(user_capacity, dtype=np.float32)
+        cls._radius_buffer = np.full(user_capacity, -np.inf, dtype=np.float32)
+        for slot, block in enumerate(blocks):
+            cls._set_centroid(slot, block)
+        cls._set_users(offsets, users)
+
+    @classmethod
+    def _set_users(cls, offsets, users):
+        """Install the user list once the row buffers are in place (lock held)"""
+        cls.user_offsets = offsets
+        cls.users = users
+        cls._slot_by_user_id = {u['user_id']: i for i, u in enumerate(users)}
+        cls._slot_by_oid = {u['_id']: i for i, u in enumerate(users) if '_id' in u}
+        cls._build_index()
+        cls._publish()
+
+    @classmethod
+    def _build_index(cls):
+        """Start rebuilding the ANN index over the current rows (lock held).
+
+        Training and filing every row take seconds on large galleries, so this
+        only drops the current index and hands the work to a background
+        thread; it must not stall the request that changed the gallery.
+        """
+        cls._index_generation += 1
+        previous, cls.index = cls.index, None
+        if Config.GALLERY_INDEX != "ivf" or cls._size < Config.IVF_MIN_ROWS:
+            cls._index_thread = None
+            return
+        cls._index_thread = threading.Thread(
+            target=cls._rebuild_index,
+            args=(cls._index_generation, previous, cls._buffer, cls._size),
+            name="gallery-index",
+            daemon=True
+        )
+        cls._index_thread.start()
+
+    @classmethod
+    def _rebuild_index(cls, generation, previous, rows, size):
+        """Build an index over ``rows[:size]`` and swap it in unless the rows
+        were replaced meanwhile; rows appended since are filed before the swap"""
+        started = time.perf_counter()
+        try:
+            if previous is None or previous.needs_retrain(size):
+                index = IVFIndex(Config.IVF_NLIST or int(4 * np.sqrt(size)), Config.IVF_NPROBE)
+                index.train(rows[:size])
+            else:
+                index = previous.with_centroids()
+            index.build(rows[:size])
+        except Exception as e:
+            print(f"✗ Gallery index build failed: {e}")
+            with cls._lock:
+                if generation == cls._index_generation:
+                    cls._index_thread = None  # Let the next add_user retry
+            return
+        with cls._lock:
+            if generation != cls._index_generation:
+                return
+            if cls._size > size:
+                index.add(size, cls._buffer[size:cls._size])
+            cls.index = index
+            cls._index_thread = None
+        print(f"✓ Gallery index built: {size} rows in {time.perf_counter() - started:.1f}s")
+
+    @classmethod
+    def wait_for_index(cls, timeout=None):
+        """Block until a pending background index build has been swapped in"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        thread = cls._index_thread
+        while thread is not None and thread.is_alive():
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            thread = cls._index_thread
+
+    @classmethod
+    def load(cls):
+        """Build the gallery from every user document in MongoDB"""
+        users_collection = Database.get_users_collection()
+        if users_collection is None:
+            return False
+
+        blocks = []
+        users = []
+        for user in users_collection.find():
+            stored = cls._user_encodings(user)
+            if stored is None:
+                continue
+            blocks.append(stored)
+            users.append(cls._strip(user))
+
+        with cls._lock:
+            cls._reset(blocks, users, 2 * sum(len(b) for b in blocks))
+            cls.loaded = True
+
+        print(f"✓ Face gallery loaded: {len(users)} users, {cls._size} encodings")
+        return True
+
+    @classmethod
+    def save_snapshot(cls, directory=None):
+        """Write the live gallery to a new snapshot under ``directory``.
+
+        Every array is a plain .npy file, users.json holds the user documents
+        (without encodings) and meta.json the format and version stamp. Row
+        arrays carry zeroed headroom so workers can append registrations into
+        their copy-on-write mapping. The snapshot is written to a temporary
+        directory and published by atomically replacing the CURRENT pointer;
+        only the previous snapshot is kept. Publishing and cleanup hold an
+        exclusive lock on ``.lock`` so concurrent writers (API workers) never
+        delete each other's fresh snapshot. Returns the snapshot path.
+        """
+        directory = directory or Config.GALLERY_SNAPSHOT_DIR
+        with cls._lock:
+            ends = np.append(cls.user_offsets[1:], cls._size)
+            live = [slot for slot, user in enumerate(cls.users) if user is not None]
+            blocks = [cls._buffer[cls.user_offsets[slot]:ends[slot]].copy() for slot in live]
+            users = [cls.users[slot] for slot in live]
+            centroids = cls._centroid_buffer[live]
+            centroid_sq = cls._centroid_sq_buffer[live]
+            radii = cls._radius_buffer[live]
+            version = cls.version
+
+        lengths = np.array([len(b) for b in blocks], dtype=np.int64)
+        num_rows = int(lengths.sum())
+        row_room = num_rows + max(cls.MIN_CAPACITY, num_rows // 4)
+        user_room = len(users) + max(cls.MIN_CAPACITY, len(users) // 4)
+
+        def padded(values, room, fill, dtype, width=None):
+            shape = (room, width) if width else (room,)
+            array = np.full(shape, fill, dtype=dtype)
+            array[:len(values)] = values
+            return array
+
+        encodings = np.concatenate(blocks) if blocks else np.empty((0, ENCODING_DIM), dtype=np.float32)
+        arrays = {
+            "encodings": padded(encodings, row_room, 0, np.float32, ENCODING_DIM),
+            "sq_norms": padded(np.einsum('ij,ij->i', encodings, encodings), row_room, np.inf, np.float32),
+            "row_users": padded(np.repeat(np.arange(len(users), dtype=np.int32), lengths), row_room, -1, np.int32),
+            "centroids": padded(centroids, user_room, 0, np.float32, ENCODING_DIM),
+            "centroid_sq": padded(centroid_sq, user_room, 0, np.float32),
+            "radii": padded(radii, user_room, -np.inf, np.float32),
+            "user_offsets": np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64) if len(users) else np.empty(0, dtype=np.int64)
+        }
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "encoding_dim": ENCODING_DIM,
+            "num_rows": num_rows,
+            "num_users": len(users),
+            "gallery_version": version,
+            "created_at": time.time()
+        }
+
+        os.makedirs(directory, exist_ok=True)
+        name = f"v{version}-{int(meta['created_at'] * 1000)}-{os.getpid()}"
+        tmp_path = os.path.join(directory, f".tmp-{name}")
+        os.makedirs(tmp_path)
+        for key, array in arrays.items():
+            np.save(os.path.join(tmp_path, f"{key}.npy"), array)
+        with open(os.path.join(tmp_path, "users.json"), "w", encoding="utf-8") as f:
+            f.write(json_util.dumps(users))
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        with open(os.path.join(directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            os.rename(tmp_path, os.path.join(directory, name))
+
+            previous = cls._current_snapshot(directory)
+            pointer = os.path.join(directory, f".CURRENT-{name}")
+            with open(pointer, "w") as f:
+                f.write(name)
+            os.replace(pointer, os.path.join(directory, "CURRENT"))
+
+            # Workers still mapping an older snapshot keep its (unlinked) files alive
+            for entry in os.listdir(directory):
+                if entry not in (name, previous, "CURRENT") and not entry.startswith("."):
+                    cls._remove_snapshot(os.path.join(directory, entry))
+
+        print(f"✓ Gallery snapshot {name}: {len(users)} users, {num_rows} encodings")
+        return os.path.join(directory, name)
+
+    @staticmethod
+    def _current_snapshot(directory):
+        try:
+            with open(os.path.join(directory, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _remove_snapshot(path):
+        if not os.path.isdir(path):
+            return
+        for entry in os.listdir(path):
+            os.remove(os.path.join(path, entry))
+        os.rmdir(path)
+
+    @classmethod
+    def load_snapshot(cls, directory=None):
+        """Map the current snapshot read-only (copy-on-write) instead of
+        reading MongoDB; returns False if there is no usable snapshot.
+
+        Pages are shared between every worker mapping the same files until a
+        worker writes to them (new registrations, removals). Callers should
+        then catch up on changes made after the snapshot, e.g. with
+        GallerySync.reconcile().
+        """
+        directory = directory or Config.GALLERY_SNAPSHOT_DIR
+        if not directory:
+            return False
+        name = cls._current_snapshot(directory)
+        if name is None:
+            return False
+
+        started = time.perf_counter()
+        path = os.path.join(directory, name)
+        try:
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("format") != SNAPSHOT_FORMAT or meta.get("encoding_dim") != ENCODING_DIM:
+                print(f"✗ Ignoring gallery snapshot {name}: unsupported format")
+                return False
+            arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="c") for key in SNAPSHOT_ARRAYS}
+            with open(os.path.join(path, "users.json"), encoding="utf-8") as f:
+                users = json_util.loads(f.read())
+        except (OSError, ValueError) as e:
+            print(f"✗ Could not load gallery snapshot {name}: {e}")
+            return False
+
+        with cls._lock:
+            cls._buffer = arrays["encodings"]
+            cls._sq_buffer = arrays["sq_norms"]
+            cls._owner_buffer = arrays["row_users"]
+            cls._centroid_buffer = arrays["centroids"]
+            cls._centroid_sq_buffer = arrays["centroid_sq"]
+            cls._radius_buffer = arrays["radii"]
+            cls._size = meta["num_rows"]
+            cls._dead_rows = 0
+            cls._set_users(np.array(arrays["user_offsets"]), users)
+            cls.loaded = True
+
+        print(f"✓ Face gallery mapped from snapshot {name}: {len(users)} users, "
+              f"{cls._size} encodings in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return True
+
+    @classmethod
+    def _compact(cls):
+        """Drop tombstoned users and rows without touching MongoDB (lock held)"""
+        blocks = []
+        users = []
+        ends = np.append(cls.user_offsets[1:], cls._size)
+        for slot, user in enumerate(cls.users):
+            if user is None:
+                continue
+            blocks.append(cls._buffer[cls.user_offsets[slot]:ends[slot]].copy())
+            users.append(user)
+        live_rows = cls._size - cls._dead_rows
+        cls._reset(blocks, users, 2 * live_rows)
+
+    @classmethod
+    def add_user(cls, user, replace=False):
+        """Append a user document's encodings; returns False if nothing changed"""
+        stored = cls._user_encodings(user)
+        if stored is None:
+            return False
+
+        with cls._lock:
+            existing = cls._slot_by_user_id.get(user['user_id'])
+            if existing is not None:
+                if not replace and cls.users[existing].get('_id') == user.get('_id'):
+                    return False
+                cls._remove_slot(existing)
+
+            needed = cls._size + len(stored)
+            if needed > len(cls._buffer):
+                capacity = max(2 * len(cls._buffer), needed, cls.MIN_CAPACITY)
+                buffer = np.empty((capacity, ENCODING_DIM), dtype=np.float32)
+                sq_buffer = np.full(capacity, np.inf, dtype=np.float32)
+                owner_buffer = np.full(capacity, -1, dtype=np.int32)
+                buffer[:cls._size] = cls._buffer[:cls._size]
+                sq_buffer[:cls._size] = cls._sq_buffer[:cls._size]
+                owner_buffer[:cls._size] = cls._owner_buffer[:cls._size]
+                cls._buffer, cls._sq_buffer, cls._owner_buffer = buffer, sq_buffer, owner_buffer
+
+            slot = len(cls.users)
+            start = cls._size
+            cls._buffer[start:needed] = stored
+            cls._sq_buffer[start:needed] = np.einsum('ij,ij->i', stored, stored)
+            cls._owner_buffer[start:needed] = slot
+            cls._size = needed
+            cls._set_centroid(slot, stored)
+
+            if cls.index is not None and not cls.index.needs_retrain(needed):
+                cls.index.add(start, stored)
+            elif cls._index_thread is None:
+                # A build already running files these rows before its swap
+                cls._build_index()
+
+            doc = cls._strip(user)
+            cls.users.append(doc)
+            cls.user_offsets = np.append(cls.user_offsets, start)
+            cls._slot_by_user_id[doc['user_id']] = slot
+            if '_id' in doc:
+                cls._slot_by_oid[doc['_id']] = slot
+            cls._publish()
+        return True
+
+    @classmethod
+    def _remove_slot(cls, slot):
+        """Tombstone every row of a user slot (lock held)"""
+        start = cls.user_offsets[slot]
+        end = cls.user_offsets[slot + 1] if slot + 1 < len(cls.user_offsets) else cls._size
+        cls._sq_buffer[start:end] = np.inf
+        cls._owner_buffer[start:end] = -1
+        # A radius of -inf makes the centroid lower bound infinite
+        cls._radius_buffer[slot] = -np.inf
+        cls._dead_rows += int(end - start)
+
+        user = cls.users[slot]
+        cls._slot_by_user_id.pop(user['user_id'], None)
+        cls._slot_by_oid.pop(user.get('_id'), None)
+        # Copy-on-write so concurrent searches never see a half-removed list
+        users = list(cls.users)
+        users[slot] = None
+        cls.users = users
+
+    @classmethod
+    def remove_user(cls, user_id=None, oid=None):
+        """Remove a user by user_id or MongoDB _id; returns False if unknown"""
+        with cls._lock:
+            slot = cls._slot_by_user_id.get(user_id) if user_id is not None else cls._slot_by_oid.get(oid)
+            if slot is None:
+                return False
+            cls._remove_slot(slot)
+            if cls._size and cls._dead_rows > cls.COMPACT_RATIO * cls._size:
+                cls._compact()
+            else:
+                cls._publish()
+        return True
+
+    @classmethod
+    def known_oids(cls):
+        with cls._lock:
+            return set(cls._slot_by_oid)
+
+    @classmethod
+    def size(cls):
+        return cls._size - cls._dead_rows
+
+    @classmethod
+    def _snapshot(cls):
+        with cls._lock:
+            return (cls.encodings, cls.sq_norms, cls.row_users, cls.user_offsets,
+                    cls.users, cls.index, cls.centroids, cls.centroid_sq, cls.radii)
+
+    @staticmethod
+    def _slot_rows(slots, user_offsets, num_rows):
+        """Sorted gallery rows belonging to the given (sorted) user slots"""
+        starts = user_offsets[slots]
+        ends = np.append(user_offsets[1:], num_rows)[slots]
+        lengths = ends - starts
+        shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return np.arange(lengths.sum()) + shifts
+
+    @classmethod
+    def _centroid_rows(cls, queries, snapshot, threshold=None, complete=False):
+        """Rows of every user whose centroid lower bound beats the best exact
+        distance among the top-k users, capped at ``threshold``; with
+        ``complete`` every user that may be under ``threshold`` is kept"""
+        encodings, sq_norms, _, user_offsets, _, _, centroids, centroid_sq, radii = snapshot
+        num_rows = len(encodings)
+
+        query_sq = np.einsum('ij,ij->i', queries, queries)[:, None]
+        sq_centroid = centroid_sq[None, :] - 2.0 * (queries @ centroids.T) + query_sq
+        lower = np.sqrt(np.maximum(sq_centroid, 0.0)) - radii[None, :]
+
+        # Stage one: exact distances to the users with the smallest bound
+        k = min(Config.CENTROID_TOP_K, lower.shape[1])
+        top = np.unique(np.argpartition(lower, k - 1, axis=1)[:, :k])
+        rows = cls._slot_rows(top, user_offsets, num_rows)
+        sq_dist = sq_norms[rows][None, :] - 2.0 * (queries @ encodings[rows].T) + query_sq
+        bound = np.sqrt(np.maximum(sq_dist.min(axis=1), 0.0))
+        if threshold is not None:
+            bound = np.full_like(bound, threshold) if complete else np.minimum(bound, threshold)
+
+        # Stage two: anyone whose lower bound does not rule them out
+        candidates = (lower < (bound + cls.BOUND_EPSILON)[:, None]).any(axis=0)
+        candidates[top] = True
+        return cls._slot_rows(np.flatnonzero(candidates), user_offsets, num_rows)
+
+    @classmethod
+    def _candidate_rows(cls, queries, snapshot, threshold=None, complete=False):
+        """Rows to compare exactly for ``queries``, or None for a full scan"""
+        encodings, index, user_offsets = snapshot[0], snapshot[5], snapshot[3]
+        if Config.GALLERY_INDEX == "centroid" and len(user_offsets):
+            return cls._centroid_rows(queries, snapshot, threshold, complete)
+        if index is None:
+            return None
+        rows = index.candidates(queries)
+        return rows[rows < len(encodings)]
+
+    @classmethod
+    def search(cls, face_encoding, threshold=None):
+        """Return (user, distance) of the closest stored encoding, or (None, inf).
+
+        With ``threshold`` pruned modes may skip the exact best when nothing is
+        under it; the returned distance is then still >= ``threshold``.
+        """
+        snapshot = cls._snapshot()
+        encodings, sq_norms, row_users, _, users = snapshot[:5]
+
+        if len(encodings) == 0:
+            return None, float('inf')
+
+        query = np.asarray(face_encoding, dtype=np.float32).reshape(ENCODING_DIM)
+        rows = cls._candidate_rows(query[None, :], snapshot, threshold)
+        if rows is not None:
+            if len(rows) == 0:
+                return None, float('inf')
+            encodings, sq_norms, row_users = encodings[rows], sq_norms[rows], row_users[rows]
+
+        # ||e - q||^2 = ||e||^2 - 2 e.q + ||q||^2, one GEMV over the whole gallery
+        sq_dist = sq_norms - 2.0 * (encodings @ query)
+        best_row = int(np.argmin(sq_dist))
+        if row_users[best_row] < 0:
+            return None, float('inf')
+        best_sq = float(sq_dist[best_row]) + float(query @ query)
+        distance = float(np.sqrt(max(best_sq, 0.0)))
+        return users[row_users[best_row]], distance
+
+    @classmethod
+    def user_distances(cls, face_encodings, threshold=None, complete=False):
+        """Return (users, distances) where distances[i, j] is the closest
+        distance between query i and any encoding of users[j]; removed users
+        are None with an infinite distance.
+
+        Pruned modes leave ruled-out users at inf and, like ``search``, only
+        guarantee the closest user per query under ``threshold``. With
+        ``complete`` the centroid mode keeps every user under ``threshold``.
+        """
+        snapshot = cls._snapshot()
+        encodings, sq_norms, row_users, user_offsets, users = snapshot[:5]
+
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if len(encodings) == 0 or len(queries) == 0:
+            return users, np.full((len(queries), len(users)), np.inf, dtype=np.float32)
+
+        query_sq = np.einsum('ij,ij->i', queries, queries)[:, None]
+        rows = cls._candidate_rows(queries, snapshot, threshold, complete)
+        if rows is None:
+            # (N, M) squared distances in one GEMM; each user's rows are contiguous
+            sq_dist = sq_norms[None, :] - 2.0 * (queries @ encodings.T) + query_sq
+            per_user = np.minimum.reduceat(sq_dist, user_offsets, axis=1)
+            return users, np.sqrt(np.maximum(per_user, 0.0))
+
+        # Exact distances on the candidate rows only; rows are sorted so each
+        # user's candidates are still contiguous
+        per_user = np.full((len(queries), len(user_offsets)), np.inf, dtype=np.float32)
+        rows = rows[row_users[rows] >= 0]
+        if len(rows):
+            owners = row_users[rows]
+            sq_dist = sq_norms[rows][None, :] - 2.0 * (queries @ encodings[rows].T) + query_sq
+            starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+            per_user[:, owners[starts]] = np.minimum.reduceat(sq_dist, starts, axis=1)
+        return users, np.sqrt(np.maximum(per_user, 0.0))
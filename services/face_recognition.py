@@ -1,18 +1,81 @@
-import cv2
 import numpy as np
-import face_recognition
-from config import Database, Config
+from config import Config
+from services.face_gallery import FaceGallery
+from services.face_tracker import associate
+from services.metrics import Metrics
+
+# cv2 and face_recognition (dlib models) are imported inside the functions that
+# use them: the API process only matches encodings, workers import them once.
 
 class FaceRecognitionService:
+    @staticmethod
+    def decode_reduction():
+        """JPEG decode reduction factor for recognition frames (1, 2, 4 or 8)"""
+        if Config.DECODE_REDUCTION != "auto":
+            return int(Config.DECODE_REDUCTION)
+        reduction = 1
+        while reduction < 8 and Config.DETECTION_SCALE * reduction * 2 <= 1.0:
+            reduction *= 2
+        return reduction
+
+    @staticmethod
+    def decode_image(image_bytes, reduction=1):
+        """Decode image bytes to RGB.
+
+        With ``reduction`` > 1 a JPEG is decoded straight at 1/reduction size
+        (IMREAD_REDUCED_COLOR_N), skipping most of the IDCT work and the
+        full-size buffer. The BGR->RGB swap is done in place.
+        """
+        import cv2
+        flags = {
+            1: cv2.IMREAD_COLOR,
+            2: cv2.IMREAD_REDUCED_COLOR_2,
+            4: cv2.IMREAD_REDUCED_COLOR_4,
+            8: cv2.IMREAD_REDUCED_COLOR_8
+        }
+        with Metrics.timed("decode"):
+            img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flags[reduction])
+        if img is None:
+            raise ValueError("Could not decode image")
+        with Metrics.timed("color_convert"):
+            cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+        return img
+
+    @staticmethod
+    @Metrics.timed("detect")
+    def detect_faces(rgb_img, scale=None, upsample=None):
+        """Detect faces on a downscaled copy and return boxes in full-resolution
+        (top, right, bottom, left) coordinates"""
+        import cv2
+        import face_recognition
+        if scale is None:
+            scale = Config.DETECTION_SCALE
+        if upsample is None:
+            upsample = Config.DETECTION_UPSAMPLE
+
+        if scale >= 1.0:
+            return face_recognition.face_locations(rgb_img, upsample, Config.DETECTION_MODEL)
+
+        small = cv2.resize(rgb_img, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        height, width = rgb_img.shape[:2]
+        locations = []
+        for top, right, bottom, left in face_recognition.face_locations(small, upsample, Config.DETECTION_MODEL):
+            locations.append((
+                max(0, int(round(top / scale))),
+                min(width, int(round(right / scale))),
+                min(height, int(round(bottom / scale))),
+                max(0, int(round(left / scale)))
+            ))
+        return locations
+
     @staticmethod
     def encode_face_from_image(image_bytes):
         """Extract face encoding from image bytes"""
+        import face_recognition
         try:
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            rgb_img = FaceRecognitionService.decode_image(image_bytes)
             
-            face_locations = face_recognition.face_locations(rgb_img)
+            face_locations = FaceRecognitionService.detect_faces(rgb_img)
             
             if len(face_locations) == 0:
                 return None, "No face detected in image"
@@ -20,7 +83,8 @@ class FaceRecognitionService:
             if len(face_locations) > 1:
                 return None, "Multiple faces detected. Please upload image with single face"
             
-            face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
+            with Metrics.timed("encode"):
+                face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
             
             if len(face_encodings) == 0:
                 return None, "Could not encode face"
@@ -30,59 +94,57 @@ class FaceRecognitionService:
             return None, f"Error processing image: {str(e)}"
 
     @staticmethod
-    def extract_all_faces(image_bytes):
-        """Extract all face encodings and locations from an image"""
+    def extract_all_faces(image_bytes, skip_boxes=None):
+        """Extract all face encodings and locations from an image.
+
+        The frame is decoded at 1/decode_reduction() size and detection runs
+        at DETECTION_SCALE of the original; faces are encoded on the decoded
+        frame. Returned boxes are in original-frame coordinates. Faces
+        associated with one of ``skip_boxes`` (already-identified tracks) are
+        not encoded and get None in the encodings list.
+        """
+        import face_recognition
         try:
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            reduction = FaceRecognitionService.decode_reduction()
+            rgb_img = FaceRecognitionService.decode_image(image_bytes, reduction)
             
-            face_locations = face_recognition.face_locations(rgb_img)
+            decoded_locations = FaceRecognitionService.detect_faces(
+                rgb_img, min(1.0, Config.DETECTION_SCALE * reduction)
+            )
             
-            if len(face_locations) == 0:
+            if len(decoded_locations) == 0:
                 return [], [], "No face detected"
-                
-            face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
+
+            face_locations = [tuple(v * reduction for v in box) for box in decoded_locations]
+
+            if not skip_boxes:
+                with Metrics.timed("encode"):
+                    face_encodings = face_recognition.face_encodings(rgb_img, decoded_locations)
+                return face_locations, face_encodings, None
+
+            tracked = associate(skip_boxes, face_locations, Config.TRACK_IOU_THRESHOLD)
+            to_encode = [loc for loc, t in zip(decoded_locations, tracked) if t is None]
+            with Metrics.timed("encode"):
+                encoded = iter(face_recognition.face_encodings(rgb_img, to_encode) if to_encode else [])
+            face_encodings = [next(encoded) if t is None else None for t in tracked]
             return face_locations, face_encodings, None
         except Exception as e:
             return [], [], str(e)
 
     @staticmethod
+    @Metrics.timed("match")
     def find_matching_face(face_encoding, threshold=None):
-        """Find matching face in database"""
+        """Find matching face in the in-memory gallery"""
         if threshold is None:
             threshold = Config.FACE_MATCH_THRESHOLD
             
         try:
-            users_collection = Database.get_users_collection()
-            if users_collection is None:
+            if not FaceGallery.loaded and not FaceGallery.load():
                 return None, 1.0
 
-            all_users = list(users_collection.find())
-            
-            if not all_users:
-                return None, 1.0
-            
-            best_match = None
-            best_distance = 1.0
-            test_encoding = np.array(face_encoding)
-            
-            for user in all_users:
-                if 'face_encodings' not in user and 'face_encoding' not in user:
-                    continue
-                
-                if 'face_encodings' in user:
-                    stored_encodings = [np.array(enc) for enc in user['face_encodings']]
-                else:
-                    stored_encodings = [np.array(user['face_encoding'])]
-                
-                distances = face_recognition.face_distance(stored_encodings, test_encoding)
-                min_distance = np.min(distances)
-                
-                if min_distance < best_distance:
-                    best_distance = min_distance
-                    best_match = user
-            
+            best_match, best_distance = FaceGallery.search(face_encoding, threshold)
+            best_distance = min(best_distance, 1.0)
+
             if best_match and best_distance < threshold:
                 return best_match, best_distance
             
@@ -91,3 +153,60 @@ class FaceRecognitionService:
         except Exception as e:
             print(f"Error finding match: {e}")
             return None, 1.0
+
+    @staticmethod
+    def _assign_faces(users, distances, threshold):
+        """Greedy one-to-one assignment over all (face, user) pairs under the
+        threshold, closest first; returns ({face: user_slot}, contested)"""
+        face_idx, user_idx = np.nonzero(distances < threshold)
+        order = np.argsort(distances[face_idx, user_idx], kind='stable')
+        assigned, taken_users = {}, set()
+        contested = False
+        for k in order:
+            f, u = int(face_idx[k]), int(user_idx[k])
+            if f in assigned:
+                continue
+            if u in taken_users:
+                contested = True
+                continue
+            assigned[f] = u
+            taken_users.add(u)
+        return assigned, contested
+
+    @staticmethod
+    @Metrics.timed("match")
+    def find_matching_faces(face_encodings, threshold=None):
+        """Match every face of a frame at once with one-to-one assignment.
+
+        Returns a list of (user, distance) aligned with ``face_encodings``;
+        a user is assigned to at most one face, closest pairs first.
+        """
+        if threshold is None:
+            threshold = Config.FACE_MATCH_THRESHOLD
+
+        num_faces = len(face_encodings)
+        try:
+            if num_faces == 0:
+                return []
+            if not FaceGallery.loaded and not FaceGallery.load():
+                return [(None, 1.0)] * num_faces
+
+            users, distances = FaceGallery.user_distances(face_encodings, threshold)
+            if len(users) == 0:
+                return [(None, 1.0)] * num_faces
+
+            assigned, contested = FaceRecognitionService._assign_faces(users, distances, threshold)
+            if contested and Config.GALLERY_INDEX == "centroid":
+                # A face lost its closest user: its runner-up may have been pruned
+                users, distances = FaceGallery.user_distances(face_encodings, threshold, complete=True)
+                assigned, _ = FaceRecognitionService._assign_faces(users, distances, threshold)
+
+            best_distances = np.minimum(distances.min(axis=1), 1.0)
+            results = [(None, float(d)) for d in best_distances]
+            for f, u in assigned.items():
+                results[f] = (users[u], float(distances[f, u]))
+            return results
+
+        except Exception as e:
+            print(f"Error finding matches: {e}")
+            return [(None, 1.0)] * num_faces
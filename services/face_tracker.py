@@ -0,0 +1,148 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+
+MAX_SESSION_ID_LENGTH = 128
+
+
+def box_iou(a, b):
+    """IoU of two (top, right, bottom, left) boxes"""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def associate(tracked_boxes, boxes, iou_threshold):
+    """Greedy IoU association; returns, for each box, the index of its tracked
+    box or None"""
+    pairs = sorted(
+        ((box_iou(t, b), ti, bi) for ti, t in enumerate(tracked_boxes) for bi, b in enumerate(boxes)),
+        reverse=True
+    )
+    result = [None] * len(boxes)
+    used = set()
+    for iou, ti, bi in pairs:
+        if iou < iou_threshold:
+            break
+        if ti in used or result[bi] is not None:
+            continue
+        used.add(ti)
+        result[bi] = ti
+    return result
+
+
+class Track:
+    _ids = itertools.count(1)
+
+    def __init__(self, box, now):
+        self.id = next(self._ids)
+        self.box = box
+        self.user = None
+        self.distance = 1.0
+        self.last_seen = now
+        self.last_frame = 0
+        self.frames_since_encode = 0
+
+    @property
+    def confidence(self):
+        return 1.0 - self.distance
+
+
+class FaceTracker:
+    """Per-session face tracks so consecutive kiosk frames can reuse an identity.
+
+    Detection still runs on every frame, but a face whose box overlaps a
+    confidently identified track skips the 128-d encoding and gallery search.
+    A track is re-encoded every TRACK_REENCODE_EVERY frames, as soon as its
+    confidence falls below TRACK_MIN_CONFIDENCE, and whenever it is unknown.
+    An identity is only reused for a track seen on the session's previous
+    frame at most TRACK_MAX_GAP seconds ago: once a face went missing,
+    whoever appears in its place is encoded again. Tracks not seen for
+    TRACK_TTL seconds are dropped.
+    """
+    # Least recently used first; bounded since session ids come from clients
+    _sessions = OrderedDict()
+    _sessions_lock = threading.Lock()
+
+    def __init__(self):
+        self.tracks = []
+        self.frame = 0
+
+    @classmethod
+    def for_session(cls, session_id):
+        """Tracker shared by every request carrying the same session id"""
+        if len(session_id) > MAX_SESSION_ID_LENGTH:
+            return cls()
+        now = time.monotonic()
+        with cls._sessions_lock:
+            while cls._sessions:
+                _, (_, last_used) = next(iter(cls._sessions.items()))
+                if now - last_used <= Config.TRACK_SESSION_TTL:
+                    break
+                cls._sessions.popitem(last=False)
+            entry = cls._sessions.pop(session_id, None)
+            tracker = entry[0] if entry else cls()
+            cls._sessions[session_id] = (tracker, now)
+            while len(cls._sessions) > Config.TRACK_MAX_SESSIONS:
+                cls._sessions.popitem(last=False)
+            return tracker
+
+    def _expire(self, now):
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= Config.TRACK_TTL]
+
+    def reusable_tracks(self):
+        """Start a frame; returns the tracks whose identity may be reused
+        without re-encoding"""
+        now = time.monotonic()
+        self._expire(now)
+        self.frame += 1
+        return [
+            t for t in self.tracks
+            if t.user is not None
+            and t.last_frame == self.frame - 1
+            and now - t.last_seen <= Config.TRACK_MAX_GAP
+            and t.confidence >= Config.TRACK_MIN_CONFIDENCE
+            and t.frames_since_encode < Config.TRACK_REENCODE_EVERY
+        ]
+
+    def match(self, boxes, reusable):
+        """Associate detected boxes with tracks (None = new face).
+
+        Boxes are first associated with ``reusable`` exactly like
+        FaceRecognitionService.extract_all_faces does with their boxes, so a
+        face has no encoding iff it got a reusable track here.
+        """
+        iou_threshold = Config.TRACK_IOU_THRESHOLD
+        result = [reusable[i] if i is not None else None
+                  for i in associate([t.box for t in reusable], boxes, iou_threshold)]
+
+        others = [t for t in self.tracks if t not in reusable]
+        free = [i for i, t in enumerate(result) if t is None]
+        for i, j in zip(free, associate([t.box for t in others], [boxes[i] for i in free], iou_threshold)):
+            if j is not None:
+                result[i] = others[j]
+        return result
+
+    def update(self, track, box, user=None, distance=None):
+        """Record a sighting; pass ``user``/``distance`` when the face was
+        re-encoded and matched, omit them when the identity was reused"""
+        now = time.monotonic()
+        if track is None:
+            track = Track(box, now)
+            self.tracks.append(track)
+        track.box = box
+        track.last_seen = now
+        track.last_frame = self.frame
+        if distance is None:
+            track.frames_since_encode += 1
+        else:
+            track.user = user
+            track.distance = distance
+            track.frames_since_encode = 0
+        return track
@@ -0,0 +1,78 @@
+import threading
+from collections import deque, namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+# Segments mapped in this process, by name (created here or attached by a worker)
+_segments = {}
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Python < 3.13 registers every attach with the resource tracker, which
+        # would unlink the segment when the worker exits (or fight the creator's
+        # own registration when the tracker is shared), so skip it
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+class FrameRef(namedtuple("FrameRef", "name offset length")):
+    """Picklable pointer to a frame held in a FrameSlots segment"""
+    __slots__ = ()
+
+    def view(self):
+        """Zero-copy memoryview of the frame, usable in any process"""
+        segment = _segments.get(self.name)
+        if segment is None:
+            segment = _segments[self.name] = _attach(self.name)
+        return segment.buf[self.offset:self.offset + self.length]
+
+
+class FrameSlots:
+    """Fixed pool of equally sized shared-memory buffers for frame handoff.
+
+    The API process copies a frame into a free slot and sends only a small
+    FrameRef to the recognition worker, which reads it in place instead of
+    unpickling a copy. The slot must be released once the job is done. When
+    every slot is busy ``acquire`` returns None so the caller can push back
+    (HTTP 429) instead of buffering more frames.
+    """
+
+    def __init__(self, count, slot_bytes):
+        self.count = count
+        self.slot_bytes = slot_bytes
+        self._segment = shared_memory.SharedMemory(create=True, size=count * slot_bytes)
+        _segments[self._segment.name] = self._segment
+        self._free = deque(range(count))
+        self._lock = threading.Lock()
+
+    def available(self):
+        return len(self._free)
+
+    def acquire(self):
+        """Reserve a free slot id, or None when all slots are in use"""
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def write(self, slot, data):
+        """Copy ``data`` (at most slot_bytes) into ``slot``; returns its FrameRef"""
+        data = memoryview(data).cast("B")
+        if data.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {data.nbytes} bytes exceeds the {self.slot_bytes} byte slot")
+        offset = slot * self.slot_bytes
+        self._segment.buf[offset:offset + data.nbytes] = data
+        return FrameRef(self._segment.name, offset, data.nbytes)
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def close(self):
+        _segments.pop(self._segment.name, None)
+        self._segment.close()
+        self._segment.unlink()
@@ -0,0 +1,109 @@
+import threading
+from pymongo.errors import PyMongoError
+from config import Database, Config
+from services.face_gallery import FaceGallery
+
+
+class GallerySync:
+    """Keep the in-memory gallery in sync with changes made by other workers.
+
+    Uses a MongoDB change stream on the users collection when the server
+    supports it (replica set / Atlas) and falls back to polling the set of
+    user ids on a standalone server.
+    """
+    _thread = None
+    _stop = threading.Event()
+    mode = None
+
+    @classmethod
+    def start(cls):
+        if cls._thread is not None or Config.GALLERY_SYNC_MODE == "off":
+            return
+        cls._stop.clear()
+        cls._thread = threading.Thread(target=cls._run, name="gallery-sync", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls):
+        cls._stop.set()
+        cls._thread = None
+
+    @classmethod
+    def _run(cls):
+        if Config.GALLERY_SYNC_MODE != "poll":
+            try:
+                cls._watch()
+                return
+            except PyMongoError as e:
+                print(f"Change stream unavailable, polling users instead: {e}")
+        cls._poll()
+
+    @classmethod
+    def _watch(cls):
+        users_collection = Database.get_users_collection()
+        if users_collection is None:
+            raise PyMongoError("No database connection")
+
+        resume_token = None
+        while not cls._stop.is_set():
+            with users_collection.watch(
+                full_document="updateLookup",
+                resume_after=resume_token,
+                max_await_time_ms=1000
+            ) as stream:
+                if cls.mode is None:
+                    # Catch anything written between the initial load and the watch
+                    cls.reconcile()
+                cls.mode = "change_stream"
+                print("✓ Gallery sync: watching users change stream")
+                while not cls._stop.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    resume_token = stream.resume_token
+                    cls._apply(change)
+
+    @staticmethod
+    def _apply(change):
+        operation = change.get("operationType")
+        if operation == "insert":
+            FaceGallery.add_user(change["fullDocument"])
+        elif operation in ("update", "replace"):
+            if change.get("fullDocument") is not None:
+                FaceGallery.add_user(change["fullDocument"], replace=True)
+        elif operation == "delete":
+            FaceGallery.remove_user(oid=change["documentKey"]["_id"])
+
+    @classmethod
+    def _poll(cls):
+        cls.mode = "poll"
+        print(f"✓ Gallery sync: polling users every {Config.GALLERY_POLL_INTERVAL}s")
+        while not cls._stop.wait(Config.GALLERY_POLL_INTERVAL):
+            try:
+                cls.reconcile()
+            except PyMongoError as e:
+                print(f"Gallery sync error: {e}")
+
+    @staticmethod
+    def reconcile():
+        """Apply the difference between MongoDB user ids and the gallery"""
+        users_collection = Database.get_users_collection()
+        if users_collection is None:
+            return 0
+
+        has_encodings = {"$or": [
+            {"face_encodings": {"$exists": True}},
+            {"face_encoding": {"$exists": True}}
+        ]}
+        db_oids = {doc["_id"] for doc in users_collection.find(has_encodings, {"_id": 1})}
+        known_oids = FaceGallery.known_oids()
+
+        changes = 0
+        for oid in known_oids - db_oids:
+            changes += FaceGallery.remove_user(oid=oid)
+
+        missing = list(db_oids - known_oids)
+        if missing:
+            for user in users_collection.find({"_id": {"$in": missing}}):
+                changes += FaceGallery.add_user(user)
+        return changes
@@ -0,0 +1,105 @@
+import time
+from contextlib import ContextDecorator
+from prometheus_client import Counter, Gauge, Histogram
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "face_stage_seconds", "Time spent in each recognition / attendance stage", ["stage"], buckets=STAGE_BUCKETS
+)
+FACES_PER_FRAME = Histogram(
+    "face_faces_per_frame", "Faces detected per recognition frame", buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34)
+)
+FACE_RESULTS = Counter("face_recognition_results_total", "Recognized faces by outcome", ["status"])
+UPLOADS = Counter("face_snapshot_uploads_total", "Attendance snapshot uploads by outcome", ["outcome"])
+GALLERY_USERS = Gauge("face_gallery_users", "Users in the in-memory gallery")
+GALLERY_ENCODINGS = Gauge("face_gallery_encodings", "Live encodings in the in-memory gallery")
+RECOGNITION_PENDING = Gauge("face_recognition_pool_pending", "Jobs running or queued on the recognition pool")
+UPLOAD_PENDING = Gauge("face_upload_queue_depth", "Snapshot uploads waiting in the queue")
+FRAME_SLOTS_FREE = Gauge("face_frame_slots_free", "Free shared-memory frame slots")
+DB_IN_FLIGHT = Gauge("face_db_executor_in_flight", "Calls running or queued on the DB executor")
+DB_POOL_IN_USE = Gauge("face_mongo_pool_in_use", "MongoDB connections checked out")
+
+
+class StageTimer(ContextDecorator):
+    """Time a block or function into the ``face_stage_seconds`` histogram.
+
+        with Metrics.timed("decode"): ...
+
+        @Metrics.timed("match")
+        def find_matching_faces(...): ...
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call keeps concurrent calls apart
+        return StageTimer(self.stage)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        Metrics.observe(self.stage, time.perf_counter() - self._started)
+        return False
+
+
+class Metrics:
+    """Prometheus instrumentation shared by the services.
+
+    Recognition pool workers run in separate processes whose registry is
+    never scraped, so there stage timings are buffered and returned with the
+    job result (see RecognitionPool.run), then observed in the API process.
+    """
+    timed = StageTimer
+    _worker_timings = None
+
+    @staticmethod
+    def observe(stage, seconds):
+        if Metrics._worker_timings is not None:
+            Metrics._worker_timings.append((stage, seconds))
+        else:
+            STAGE_SECONDS.labels(stage).observe(seconds)
+
+    @staticmethod
+    def collect_in_worker():
+        """Buffer observations in this process instead of recording them"""
+        Metrics._worker_timings = []
+
+    @staticmethod
+    def drain_worker_timings():
+        timings, Metrics._worker_timings = Metrics._worker_timings, []
+        return timings
+
+    @staticmethod
+    def observe_all(timings):
+        for stage, seconds in timings:
+            STAGE_SECONDS.labels(stage).observe(seconds)
+
+    @staticmethod
+    def frame(faces):
+        FACES_PER_FRAME.observe(len(faces))
+        for face in faces:
+            FACE_RESULTS.labels(face["status"]).inc()
+
+    @staticmethod
+    def upload(outcome):
+        UPLOADS.labels(outcome).inc()
+
+    @staticmethod
+    def register_gauges():
+        """Point the gauges at live service state (read at scrape time)"""
+        from config import Database
+        from services.face_gallery import FaceGallery
+        from services.upload_queue import UploadQueue
+        from services.worker_pool import RecognitionPool
+
+        GALLERY_USERS.set_function(lambda: sum(1 for user in FaceGallery.users if user is not None))
+        GALLERY_ENCODINGS.set_function(FaceGallery.size)
+        RECOGNITION_PENDING.set_function(RecognitionPool.pending)
+        UPLOAD_PENDING.set_function(UploadQueue.pending)
+        FRAME_SLOTS_FREE.set_function(lambda: RecognitionPool.frames_available())
+        DB_IN_FLIGHT.set_function(lambda: Database.in_flight)
+        DB_POOL_IN_USE.set_function(lambda: Database.pool_metrics.in_use)
@@ -0,0 +1,139 @@
+import time
+import uuid
+from datetime import datetime
+from config import Config, Database
+from services.face_recognition import FaceRecognitionService
+from services.attendance_service import AttendanceService
+from services.upload_queue import UploadQueue
+from services.worker_pool import RecognitionPool
+from services.metrics import Metrics
+
+THRESHOLD = 0.6
+
+
+class RecognitionPipeline:
+    """Per-frame attendance flow shared by the HTTP and WebSocket endpoints"""
+
+    @staticmethod
+    def _match_tracked(face_locations, face_encodings, tracker, reusable):
+        """Reuse identities of tracked faces and match only the encoded ones"""
+        tracks = tracker.match(face_locations, reusable) if tracker else [None] * len(face_locations)
+        encoded = [i for i, enc in enumerate(face_encodings) if enc is not None]
+        new_matches = FaceRecognitionService.find_matching_faces([face_encodings[i] for i in encoded])
+
+        matches = [(None, 1.0)] * len(face_locations)
+        reused_ids = set()
+        for i, track in enumerate(tracks):
+            if face_encodings[i] is None and track is not None:
+                matches[i] = (track.user, track.distance)
+                reused_ids.add(track.user['user_id'])
+
+        for i, (user, distance) in zip(encoded, new_matches):
+            # A tracked face keeps its user; it cannot also be matched to a new face
+            if user is not None and user['user_id'] in reused_ids:
+                user = None
+            matches[i] = (user, distance)
+
+        if tracker:
+            for i, (box, track) in enumerate(zip(face_locations, tracks)):
+                if face_encodings[i] is None:
+                    tracker.update(track, box)
+                else:
+                    tracker.update(track, box, *matches[i])
+        return matches
+
+    @staticmethod
+    async def process_frame(image_bytes, date, shift, tracker=None):
+        """Detect, match and log attendance for one frame.
+
+        With a FaceTracker, faces that overlap a confidently identified track
+        skip encoding and reuse its identity. Returns (faces, error). Raises
+        PoolSaturatedError / asyncio.TimeoutError from the recognition pool so
+        callers can map them to their transport.
+        """
+        started = time.perf_counter()
+        reusable = tracker.reusable_tracks() if tracker else []
+        face_locations, face_encodings, error = await RecognitionPool.run_frame(
+            FaceRecognitionService.extract_all_faces, image_bytes, [t.box for t in reusable]
+        )
+
+        if error:
+            Metrics.frame([])
+            return [], error
+
+        recognized_faces = []
+        marks = []
+        matches = RecognitionPipeline._match_tracked(face_locations, face_encodings, tracker, reusable)
+
+        for (top, right, bottom, left), (matched_user, distance) in zip(face_locations, matches):
+
+            name = "Unknown"
+            user_id = None
+            confidence = 0.0
+            status = "unknown"
+            message = "Không nhận diện được"
+
+            if matched_user:
+
+                confidence = 1.0 - distance
+
+                # áp dụng threshold
+                if confidence >= THRESHOLD:
+
+                    name = matched_user['name']
+                    user_id = matched_user['user_id']
+                    # status is decided below by a single bulk write for the frame
+                    marks.append((len(recognized_faces), user_id, name, float(confidence)))
+
+                else:
+                    # dưới threshold -> unknown
+                    name = "Unknown"
+                    user_id = None
+                    confidence = float(confidence)
+                    status = "unknown"
+                    message = "Không nhận diện được"
+
+            recognized_faces.append({
+                "top": int(top),
+                "right": int(right),
+                "bottom": int(bottom),
+                "left": int(left),
+                "name": name,
+                "user_id": user_id,
+                "confidence": float(confidence),
+                "status": status,
+                "message": message
+            })
+
+        logged_ids = []
+        if marks:
+            # image_url is patched in once the background upload finishes
+            record_ids = await Database.run(
+                AttendanceService.log_attendance_batch,
+                [(user_id, name, confidence) for _, user_id, name, confidence in marks],
+                date,
+                shift
+            )
+            for (index, _, name, _), record_id in zip(marks, record_ids):
+                face = recognized_faces[index]
+                if record_id is None:
+                    face["status"] = "already_marked"
+                    face["message"] = f"{name} đã điểm danh ca {shift} ngày {date}"
+                else:
+                    if record_id:
+                        logged_ids.append(record_id)
+                    face["status"] = "success"
+                    face["message"] = f"Điểm danh thành công: {name} - {Config.SHIFTS[shift]['name']}"
+
+        if logged_ids:
+            # One upload per frame, shared by every record marked in it
+            UploadQueue.submit(
+                image_bytes,
+                "face_recognition/attendance",
+                f"attendance_{date}_{shift}_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}",
+                lambda url: AttendanceService.set_image_url(logged_ids, url)
+            )
+
+        Metrics.frame(recognized_faces)
+        Metrics.observe("frame", time.perf_counter() - started)
+        return recognized_faces, None
@@ -0,0 +1,266 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from config import Config
+from services.worker_pool import PoolSaturatedError, _warm_worker
+
+
+class RecognitionWorkerError(Exception):
+    """A job failed or its worker process died while running it"""
+
+
+def default_socket_path():
+    """Per-user socket path used when RECOGNITION_SOCKET is not set"""
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(base, f"face-recognition-{os.getuid()}", "recognition.sock")
+
+
+def _authkey():
+    """Shared secret for the socket. Both ends unpickle what they receive, so
+    there is no default: anyone knowing the key can run code in the workers"""
+    if not Config.RECOGNITION_AUTHKEY:
+        raise RuntimeError("RECOGNITION_AUTHKEY must be set to use the recognition server")
+    return Config.RECOGNITION_AUTHKEY.encode()
+
+
+def _private_directory(path):
+    """Create the socket's directory (0700) and refuse one other users can reach"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(f"Socket directory {directory} must be owned by this user with mode 0700")
+
+
+class RecognitionServer:
+    """Supervised recognition worker processes shared by all API processes.
+
+    API processes (uvicorn --workers N with RECOGNITION_SOCKET set) connect
+    over a Unix socket and send (job_id, fn, args). Jobs wait in one bounded
+    queue and every worker process takes the next one when idle, so load
+    spreads across cores whichever API process received the frame. A full
+    queue is answered at once with "saturated" (HTTP 429 upstream). A worker
+    that dies is restarted and its in-flight job answered with an error.
+    Clients must present RECOGNITION_AUTHKEY, and the socket (mode 0600)
+    lives in a directory only this user can access.
+    """
+
+    def __init__(self, path=None, workers=None, queue_size=None):
+        if queue_size is None:
+            queue_size = Config.RECOGNITION_QUEUE_SIZE
+        self.path = path or Config.RECOGNITION_SOCKET or default_socket_path()
+        self._authkey = _authkey()
+        self.workers = workers or Config.RECOGNITION_WORKERS or os.cpu_count() or 1
+        self.jobs = queue.Queue(maxsize=self.workers + queue_size)
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = threading.Event()
+        self._listener = None
+
+    def serve_forever(self):
+        _private_directory(self.path)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._listener = Listener(self.path, "AF_UNIX", authkey=self._authkey)
+        os.chmod(self.path, 0o600)
+        for index in range(self.workers):
+            threading.Thread(target=self._supervise, args=(index,), daemon=True).start()
+        print(f"✓ Recognition server listening on {self.path}: {self.workers} workers")
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    if self._stopping.is_set():
+                        break
+                    raise
+                except multiprocessing.AuthenticationError as e:
+                    print(f"✗ Rejected recognition client: {e}")
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        for _ in range(self.workers):
+            try:
+                self.jobs.put_nowait(None)
+            except queue.Full:
+                break
+        if self._listener is not None:
+            self._listener.close()
+
+    def _serve_client(self, conn):
+        send_lock = threading.Lock()
+
+        def reply(message):
+            with send_lock:
+                try:
+                    conn.send(message)
+                except OSError:
+                    pass  # Client went away; its job result is dropped
+
+        reply((None, "hello", self.workers))
+        try:
+            while True:
+                job_id, fn, args = conn.recv()
+                try:
+                    self.jobs.put_nowait((job_id, fn, args, reply))
+                except queue.Full:
+                    reply((job_id, "saturated", f"{self.jobs.qsize()} recognition jobs pending"))
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _supervise(self, index):
+        """Run one worker process, restarting it whenever it dies"""
+        while not self._stopping.is_set():
+            parent, child = self._context.Pipe()
+            process = self._context.Process(
+                target=_worker_main, args=(child,), name=f"recognition-worker-{index}", daemon=True
+            )
+            process.start()
+            child.close()
+            job, sent = None, False
+            try:
+                while True:
+                    job, sent = self.jobs.get(), False
+                    if job is None:
+                        return
+                    job_id, fn, args, reply = job
+                    parent.send((fn, args))
+                    sent = True
+                    status, payload = parent.recv()
+                    reply((job_id, status, payload))
+                    job = None
+            except (EOFError, OSError):
+                process.join(timeout=1)
+                self.restarts += 1
+                print(f"✗ Recognition worker {index} (pid {process.pid}) died with exit code "
+                      f"{process.exitcode}, restarting")
+                if job is not None and sent:
+                    job[3]((job[0], "error", "Recognition worker crashed"))
+                elif job is not None:
+                    self._requeue(job)
+                # Avoid a tight loop when the worker cannot even start
+                time.sleep(1)
+            finally:
+                parent.close()
+                if process.is_alive():
+                    process.terminate()
+
+    def _requeue(self, job):
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            job[3]((job[0], "saturated", "Recognition worker restarting"))
+
+
+def _worker_main(conn):
+    _warm_worker()
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send(("ok", fn(*args)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class RecognitionClient:
+    """Connection from an API process to a RecognitionServer.
+
+    Exposes the ``submit`` / ``shutdown`` subset of an executor that
+    RecognitionPool uses. Jobs cannot be cancelled once sent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._authkey = _authkey()
+        self.workers = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._futures = {}
+        self._ids = itertools.count()
+
+    def connect(self, wait=0):
+        """Connect (retrying for up to ``wait`` seconds); returns the server's worker count"""
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                with self._lock:
+                    self._ensure_connected()
+                return self.workers
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def _ensure_connected(self):
+        if self._conn is not None:
+            return
+        conn = Client(self.path, "AF_UNIX", authkey=self._authkey)
+        _, _, self.workers = conn.recv()
+        self._conn = conn
+        threading.Thread(target=self._receive, args=(conn,), daemon=True).start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        # Marks it running so a timed-out caller cannot cancel it under the receiver
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            self._ensure_connected()
+            job_id = next(self._ids)
+            self._futures[job_id] = future
+            try:
+                self._conn.send((job_id, fn, args))
+            except OSError:
+                del self._futures[job_id]
+                self._disconnect(self._conn)
+                raise
+        return future
+
+    def _receive(self, conn):
+        try:
+            while True:
+                job_id, status, payload = conn.recv()
+                with self._lock:
+                    future = self._futures.pop(job_id, None)
+                if future is None:
+                    continue
+                if status == "ok":
+                    future.set_result(payload)
+                elif status == "saturated":
+                    future.set_exception(PoolSaturatedError(payload))
+                else:
+                    future.set_exception(RecognitionWorkerError(payload))
+        except (EOFError, OSError):
+            with self._lock:
+                self._disconnect(conn)
+
+    def _disconnect(self, conn):
+        """Drop a broken connection and fail its jobs (caller holds the lock)"""
+        if self._conn is not conn:
+            return
+        self._conn = None
+        conn.close()
+        futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.set_exception(RecognitionWorkerError("Lost connection to the recognition server"))
+
+    def shutdown(self, wait=False, cancel_futures=True):
+        with self._lock:
+            if self._conn is not None:
+                self._disconnect(self._conn)
@@ -0,0 +1,205 @@
+import functools
+import threading
+from datetime import datetime, timedelta
+from config import Config
+
+WEEKDAY_NAMES = ["Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ nhật"]
+
+
+class ScheduleRejected(Exception):
+    """A recognition request outside the attendance schedule.
+
+    ``reason`` is one of "shift", "date", "weekday", "holiday" or "closed";
+    ``retry_after`` is the number of seconds until the shift opens, when it
+    opens later.
+    """
+
+    def __init__(self, reason, detail, retry_after=None):
+        super().__init__(detail)
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@functools.lru_cache(maxsize=128)
+def _midnight(date_str):
+    """Start of a YYYY-MM-DD day (parsed once per distinct string)"""
+    return datetime.strptime(date_str, "%Y-%m-%d")
+
+
+def _offset(hhmm):
+    hours, minutes = hhmm.split(":")
+    return timedelta(hours=int(hours), minutes=int(minutes))
+
+
+def _load_holidays():
+    """Parse HOLIDAYS and HOLIDAYS_FILE once; bad entries are logged and skipped"""
+    dates = [d.strip() for d in Config.HOLIDAYS.split(",")]
+    if Config.HOLIDAYS_FILE:
+        try:
+            with open(Config.HOLIDAYS_FILE, encoding="utf-8") as f:
+                dates += [line.split("#")[0].strip() for line in f]
+        except OSError as e:
+            print(f"✗ Could not read HOLIDAYS_FILE: {e}")
+    holidays = set()
+    for d in dates:
+        if not d:
+            continue
+        try:
+            holidays.add(_midnight(d))
+        except ValueError:
+            print(f"✗ Ignoring invalid holiday date {d!r} (expected YYYY-MM-DD)")
+    return frozenset(holidays)
+
+
+class Schedule:
+    """Attendance calendar compiled once from Config.SHIFTS, ALLOWED_WEEKDAYS,
+    the holiday calendar and the grace periods.
+
+    ``check`` admits a (date, shift) recognition request with a handful of
+    lookups and one datetime comparison, so kiosks polling out of hours are
+    turned away before any image work. ``current`` tells clients which shift
+    is open right now.
+    """
+    _lock = threading.Lock()
+    _loaded = False
+    shifts = {}
+    weekdays = frozenset()
+    holidays = frozenset()
+    _current = (None, None)
+
+    @classmethod
+    def load(cls):
+        """(Re)compile the schedule from Config"""
+        early = timedelta(minutes=Config.SHIFT_EARLY_GRACE_MINUTES)
+        late = timedelta(minutes=Config.SHIFT_LATE_GRACE_MINUTES)
+        shifts = {}
+        for shift, info in Config.SHIFTS.items():
+            start, end = _offset(info["start"]), _offset(info["end"])
+            if end <= start:
+                end += timedelta(days=1)  # Overnight shift
+            # (start, end, opens, closes) relative to the shift's date
+            shifts[shift] = (start, end, start - early, end + late)
+        holidays = _load_holidays()
+        with cls._lock:
+            cls.shifts = shifts
+            cls.weekdays = frozenset(Config.ALLOWED_WEEKDAYS)
+            cls.holidays = holidays
+            cls._current = (None, None)
+            cls._loaded = True
+
+    @classmethod
+    def _ensure_loaded(cls):
+        if not cls._loaded:
+            cls.load()
+
+    @staticmethod
+    def parse_date(date_str):
+        """Midnight of a YYYY-MM-DD date; raises ValueError"""
+        return _midnight(date_str)
+
+    @classmethod
+    def closes_at(cls, date_str, shift):
+        """End of the admission window (late grace included, overnight shifts
+        rolled into the next day), or None for an unknown date/shift"""
+        cls._ensure_loaded()
+        window = cls.shifts.get(shift)
+        try:
+            return _midnight(date_str) + window[3] if window else None
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def weekday_name(date_str):
+        return WEEKDAY_NAMES[_midnight(date_str).weekday()]
+
+    @classmethod
+    def is_open_day(cls, day):
+        return day.weekday() in cls.weekdays and day not in cls.holidays
+
+    @classmethod
+    def check(cls, date_str, shift, now=None):
+        """Raise ScheduleRejected unless recognition for ``date_str`` /
+        ``shift`` is allowed at ``now``"""
+        cls._ensure_loaded()
+        window = cls.shifts.get(shift)
+        if window is None:
+            raise ScheduleRejected("shift", "Ca trực không hợp lệ. Chọn từ 1-4")
+        try:
+            day = _midnight(date_str)
+        except (TypeError, ValueError):
+            raise ScheduleRejected("date", "Ngày không hợp lệ")
+
+        if day.weekday() not in cls.weekdays:
+            allowed = ", ".join(WEEKDAY_NAMES[d].lower() for d in sorted(cls.weekdays))
+            raise ScheduleRejected(
+                "weekday", f"Không được phép điểm danh vào {WEEKDAY_NAMES[day.weekday()]}. Chỉ được phép {allowed}"
+            )
+        if day in cls.holidays:
+            raise ScheduleRejected("holiday", f"Ngày {date_str} là ngày nghỉ, không điểm danh")
+
+        if not Config.SHIFT_WINDOW_ENFORCED:
+            return
+        now = now or datetime.now()
+        opens, closes = day + window[2], day + window[3]
+        if not opens <= now < closes:
+            retry_after = int((opens - now).total_seconds()) + 1 if now < opens else None
+            raise ScheduleRejected(
+                "closed",
+                f"{Config.SHIFTS[shift]['name']} chỉ mở điểm danh từ {opens:%H:%M %d/%m/%Y} "
+                f"đến {closes:%H:%M %d/%m/%Y}",
+                retry_after
+            )
+
+    @classmethod
+    def current(cls, now=None):
+        """Open shift and next opening, recomputed at most once per minute"""
+        cls._ensure_loaded()
+        now = now or datetime.now()
+        minute = now.replace(second=0, microsecond=0)
+        cached_minute, cached = cls._current
+        if cached_minute == minute:
+            return cached
+        result = cls._compute_current(minute)
+        cls._current = (minute, result)
+        return result
+
+    @classmethod
+    def _compute_current(cls, now):
+        today = now.replace(hour=0, minute=0)
+        open_shifts = []
+        upcoming = None
+        # Yesterday for overnight shifts, then the next two weeks for the next opening
+        for days in range(-1, 15):
+            day = today + timedelta(days=days)
+            if not cls.is_open_day(day):
+                continue
+            for shift, (start, end, opens, closes) in sorted(cls.shifts.items(), key=lambda item: item[1][2]):
+                if day + opens <= now < day + closes:
+                    # Inside the nominal hours beats inside a grace period
+                    nominal = day + start <= now < day + end
+                    open_shifts.append((not nominal, day + closes, shift, day))
+                elif day + opens > now and upcoming is None:
+                    upcoming = (shift, day, day + opens)
+            if upcoming is not None and days >= 0:
+                break
+
+        result = {"enforced": Config.SHIFT_WINDOW_ENFORCED, "date": None, "shift": None, "next": None}
+        if open_shifts:
+            _, closes, shift, day = min(open_shifts)
+            result.update(
+                date=day.strftime("%Y-%m-%d"),
+                shift=shift,
+                shift_name=Config.SHIFTS[shift]["name"],
+                closes_at=closes.isoformat(),
+                open_shifts=sorted(s for _, _, s, _ in open_shifts)
+            )
+        if upcoming is not None:
+            shift, day, opens = upcoming
+            result["next"] = {
+                "date": day.strftime("%Y-%m-%d"),
+                "shift": shift,
+                "shift_name": Config.SHIFTS[shift]["name"],
+                "opens_at": opens.isoformat()
+            }
+        return result
@@ -0,0 +1,79 @@
+import threading
+import time
+from contextlib import contextmanager
+
+RETRY_MAX_DELAY = 30  # seconds between attempts of a retried phase
+
+
+class Startup:
+    """Timed startup phases and the readiness flag behind /api/ready.
+
+    The server accepts requests as soon as the cheap phases are done; heavy
+    warm-up (gallery, recognition workers, page templates) runs in the
+    background and ``ready`` flips once every phase has finished. Phases that
+    need MongoDB are retried with backoff, so a database that comes up after
+    the server still ends in a ready service.
+    """
+    _lock = threading.Lock()
+    _stopping = threading.Event()
+    started_at = time.monotonic()
+    phases = {}
+    failed = {}
+    ready = False
+
+    @classmethod
+    @contextmanager
+    def phase(cls, name):
+        """Time a startup phase; a failure is logged and recorded, not raised"""
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+        elapsed = round((time.perf_counter() - started) * 1000, 1)
+        with cls._lock:
+            cls.phases[name] = elapsed
+            if error is None:
+                cls.failed.pop(name, None)
+            else:
+                cls.failed[name] = str(error)
+        if error is None:
+            print(f"✓ Startup phase '{name}': {elapsed} ms")
+        else:
+            print(f"✗ Startup phase '{name}' failed: {error}")
+
+    @classmethod
+    def retry_phase(cls, name, fn):
+        """Run ``fn`` as phase ``name`` until it succeeds, backing off between
+        attempts; returns False if the server stops first"""
+        delay = 1
+        while True:
+            with cls.phase(name):
+                fn()
+            if name not in cls.failed:
+                return True
+            print(f"  Retrying '{name}' in {delay} s")
+            if cls._stopping.wait(delay):
+                return False
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    @classmethod
+    def stop(cls):
+        """Abandon pending retries (server shutdown)"""
+        cls._stopping.set()
+
+    @classmethod
+    def mark_ready(cls):
+        cls.ready = True
+        print(f"✓ Ready in {(time.monotonic() - cls.started_at) * 1000:.0f} ms")
+
+    @classmethod
+    def status(cls):
+        with cls._lock:
+            return {
+                "ready": cls.ready,
+                "uptime_seconds": round(time.monotonic() - cls.started_at, 3),
+                "phases_ms": dict(cls.phases),
+                "failed": dict(cls.failed)
+            }
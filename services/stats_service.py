@@ -0,0 +1,84 @@
+import threading
+import time
+from datetime import datetime
+from config import Config, Database
+
+
+class StatsService:
+    """Dashboard statistics from one indexed aggregation, cached for a short TTL.
+
+    Every open dashboard polls /api/stats, so results are shared: at most one
+    aggregation runs per STATS_CACHE_TTL (concurrent misses wait for it), and
+    attendance logged or deleted through this process adjusts the cached
+    counts in place instead of expiring them.
+    """
+    _lock = threading.Lock()
+    _refresh_lock = threading.Lock()
+    _stats = None
+    _computed_at = 0.0
+    _computed_wall = None
+
+    @staticmethod
+    def _compute(today):
+        users_collection = Database.get_users_collection()
+        attendance_collection = Database.get_attendance_collection()
+
+        total_users = users_collection.estimated_document_count() if users_collection is not None else 0
+        shift_counts = {f"shift_{shift_id}": 0 for shift_id in Config.SHIFTS}
+
+        if attendance_collection is not None:
+            # Served from the (date, shift) index
+            for group in attendance_collection.aggregate([
+                {"$match": {"date": today}},
+                {"$group": {"_id": "$shift", "count": {"$sum": 1}}}
+            ]):
+                shift_counts[f"shift_{group['_id']}"] = group["count"]
+
+        return {
+            "total_users": total_users,
+            "today_attendance": sum(shift_counts.values()),
+            "shift_counts": shift_counts,
+            "today": today
+        }
+
+    @classmethod
+    def _fresh(cls, today, now):
+        return cls._stats is not None and cls._stats["today"] == today and now - cls._computed_at < Config.STATS_CACHE_TTL
+
+    @classmethod
+    def get(cls):
+        """Statistics for today plus cache metadata"""
+        today = datetime.now().date().isoformat()
+        if not cls._fresh(today, time.monotonic()):
+            with cls._refresh_lock:
+                if not cls._fresh(today, time.monotonic()):
+                    stats = cls._compute(today)
+                    with cls._lock:
+                        cls._stats = stats
+                        cls._computed_at = time.monotonic()
+                        cls._computed_wall = datetime.now()
+
+        with cls._lock:
+            stats = dict(cls._stats, shift_counts=dict(cls._stats["shift_counts"]))
+            stats["cache"] = {
+                "computed_at": cls._computed_wall.isoformat(),
+                "age_seconds": round(time.monotonic() - cls._computed_at, 3),
+                "ttl_seconds": Config.STATS_CACHE_TTL
+            }
+        return stats
+
+    @classmethod
+    def record_attendance(cls, date, shift, count=1):
+        """Adjust cached counts after attendance is logged (or deleted with a negative count)"""
+        with cls._lock:
+            if cls._stats is None or cls._stats["today"] != date or count == 0:
+                return
+            key = f"shift_{shift}"
+            shift_counts = cls._stats["shift_counts"]
+            shift_counts[key] = max(0, shift_counts.get(key, 0) + count)
+            cls._stats["today_attendance"] = sum(shift_counts.values())
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._stats = None
@@ -0,0 +1,111 @@
+import queue
+import threading
+import time
+from config import Config
+from services.cloudinary_service import CloudinaryService
+from services.metrics import Metrics
+
+
+class UploadQueue:
+    """Background pipeline for attendance snapshot uploads.
+
+    Requests enqueue a frame once, however many people were marked in it, and
+    return immediately. Worker threads upload with exponential-backoff
+    retries and hand the resulting URL to the job's callback, which patches
+    ``image_url`` onto the attendance documents. ``uploader`` has the same
+    signature as CloudinaryService.upload_image (returning None on failure)
+    and can be replaced by a local stub.
+    """
+    _queue = None
+    _workers = []
+    uploader = None
+    uploaded = 0
+    failed = 0
+    dropped = 0
+
+    @classmethod
+    def start(cls, uploader=None, num_workers=None, max_size=None):
+        if cls._queue is not None:
+            return
+        cls.uploader = uploader or CloudinaryService.upload_image
+        cls._queue = queue.Queue(maxsize=max_size or Config.UPLOAD_QUEUE_SIZE)
+        cls._workers = [
+            threading.Thread(target=cls._run, name=f"upload-{i}", daemon=True)
+            for i in range(num_workers or Config.UPLOAD_WORKERS)
+        ]
+        for worker in cls._workers:
+            worker.start()
+        print(f"✓ Upload queue started: {len(cls._workers)} workers")
+
+    @classmethod
+    def stop(cls, timeout=10.0):
+        """Finish queued uploads (up to ``timeout`` seconds) and stop the workers"""
+        if cls._queue is None:
+            return
+        deadline = time.monotonic() + timeout
+        for _ in cls._workers:
+            try:
+                cls._queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for worker in cls._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+        cls._queue = None
+        cls._workers = []
+
+    @classmethod
+    def pending(cls):
+        return cls._queue.qsize() if cls._queue is not None else 0
+
+    @classmethod
+    def submit(cls, image_bytes, folder, public_id, on_done=None):
+        """Queue an upload; returns False (and drops it) when the queue is full"""
+        if cls._queue is None:
+            cls.start()
+        try:
+            cls._queue.put_nowait((image_bytes, folder, public_id, on_done))
+            return True
+        except queue.Full:
+            cls.dropped += 1
+            Metrics.upload("dropped")
+            print(f"Upload queue full, dropping {public_id}")
+            return False
+
+    @classmethod
+    @Metrics.timed("upload")
+    def _upload(cls, image_bytes, folder, public_id):
+        delay = Config.UPLOAD_RETRY_BACKOFF
+        for attempt in range(Config.UPLOAD_RETRIES + 1):
+            if attempt:
+                time.sleep(delay)
+                delay *= 2
+            try:
+                url = cls.uploader(image_bytes, folder, public_id)
+            except Exception as e:
+                print(f"Upload attempt {attempt + 1} failed for {public_id}: {e}")
+                url = None
+            if url:
+                return url
+        return None
+
+    @classmethod
+    def _run(cls):
+        jobs = cls._queue
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            image_bytes, folder, public_id, on_done = job
+            url = cls._upload(image_bytes, folder, public_id)
+            if url:
+                cls.uploaded += 1
+                Metrics.upload("uploaded")
+            else:
+                cls.failed += 1
+                Metrics.upload("failed")
+                print(f"Giving up upload of {public_id}")
+            if on_done is not None and url:
+                try:
+                    on_done(url)
+                except Exception as e:
+                    print(f"Error applying upload result for {public_id}: {e}")
@@ -0,0 +1,213 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from services.frame_slots import FrameSlots
+from services.metrics import Metrics
+
+
+class PoolSaturatedError(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class RecognitionPool:
+    """Process pool for CPU-bound dlib work (face detection / encoding).
+
+    Keeps HOG detection and the ResNet encoder off the asyncio event loop.
+    At most ``workers + queue_size`` jobs may be pending; beyond that
+    ``run`` fails fast with PoolSaturatedError so callers can answer 429.
+
+    By default the workers are child processes of this API process and the
+    pool is recreated if one of them dies. With RECOGNITION_SOCKET set, jobs
+    go to a shared RecognitionServer instead (see scripts/recognition_server.py),
+    so several API processes can feed one set of supervised workers.
+
+    ``run_frame`` hands images over through shared-memory frame slots
+    (FRAME_SLOT_BYTES) instead of pickling them with the job.
+    """
+    _executor = None
+    _frames = None
+    _lock = threading.Lock()
+    _pending = 0
+    workers = 0
+    capacity = 0
+
+    @classmethod
+    def start(cls):
+        if cls._executor is not None:
+            return
+        cls.workers = Config.RECOGNITION_WORKERS or os.cpu_count() or 1
+        cls.capacity = cls.workers + Config.RECOGNITION_QUEUE_SIZE
+        if Config.FRAME_SLOT_BYTES:
+            cls._frames = FrameSlots(Config.FRAME_SLOTS or cls.capacity, Config.FRAME_SLOT_BYTES)
+        if Config.RECOGNITION_SOCKET:
+            from services.recognition_server import RecognitionClient
+            cls._executor = RecognitionClient(Config.RECOGNITION_SOCKET)
+            print(f"✓ Recognition pool using server at {Config.RECOGNITION_SOCKET}")
+            return
+        cls._executor = cls._create_executor()
+        print(f"✓ Recognition pool started: {cls.workers} workers, {cls.capacity} max pending")
+
+    @classmethod
+    def _create_executor(cls):
+        # spawn: the API process already runs threads (gallery sync, Mongo monitors)
+        return ProcessPoolExecutor(
+            max_workers=cls.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker
+        )
+
+    @classmethod
+    def _restart(cls, broken):
+        """Replace a pool whose worker died (every pending job on it has failed)"""
+        with cls._lock:
+            if cls._executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            cls._executor = cls._create_executor()
+        print("✗ Recognition worker died, pool restarted")
+
+    @classmethod
+    def shutdown(cls):
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+        if cls._frames is not None:
+            cls._frames.close()
+            cls._frames = None
+
+    @classmethod
+    def warm(cls):
+        """Spawn the worker processes so the models are loaded before traffic
+        arrives (blocking); returns how many distinct workers answered"""
+        if cls._executor is None:
+            # Not started, or already shut down while warm-up was running
+            return 0
+        if Config.RECOGNITION_SOCKET:
+            cls.workers = cls._executor.connect(wait=Config.RECOGNITION_TIMEOUT)
+            cls.capacity = cls.workers + Config.RECOGNITION_QUEUE_SIZE
+            return cls.workers
+        futures = [cls._executor.submit(_worker_pid) for _ in range(cls.workers)]
+        return len({future.result() for future in futures})
+
+    @classmethod
+    def pending(cls):
+        return cls._pending
+
+    @classmethod
+    def frames_available(cls):
+        return cls._frames.available() if cls._frames is not None else 0
+
+    @classmethod
+    def _release(cls, _future):
+        with cls._lock:
+            cls._pending -= 1
+
+    @classmethod
+    async def run(cls, fn, *args, timeout=None):
+        """Run ``fn(*args)`` in a worker process and await its result.
+
+        Raises PoolSaturatedError when the pool is full and
+        asyncio.TimeoutError after ``timeout`` (default RECOGNITION_TIMEOUT).
+        """
+        if cls._executor is None:
+            cls.start()
+        started = time.perf_counter()
+        future, executor = cls._submit(fn, *args)
+        return await cls._result(future, executor, started, timeout)
+
+    @classmethod
+    async def run_frame(cls, fn, image_bytes, *args, timeout=None):
+        """Like ``run(fn, image_bytes, *args)``, but the image travels through a
+        shared-memory frame slot and ``fn`` receives a memoryview of it.
+
+        Raises PoolSaturatedError when every slot is in use. Images larger
+        than a slot (or with FRAME_SLOT_BYTES=0) fall back to ``run``.
+        """
+        if cls._executor is None:
+            cls.start()
+        frames = cls._frames
+        if frames is None or len(image_bytes) > frames.slot_bytes:
+            return await cls.run(fn, image_bytes, *args, timeout=timeout)
+
+        slot = frames.acquire()
+        if slot is None:
+            raise PoolSaturatedError(f"All {frames.count} frame slots in use")
+        started = time.perf_counter()
+        try:
+            ref = frames.write(slot, image_bytes)
+            future, executor = cls._submit(_from_frame, fn, ref, *args)
+        except BaseException:
+            frames.release(slot)
+            raise
+        # The slot is reused only once the worker is done reading it
+        future.add_done_callback(lambda _future: frames.release(slot))
+        return await cls._result(future, executor, started, timeout)
+
+    @classmethod
+    def _submit(cls, fn, *args):
+        """Reserve a pending slot and submit the job; returns (future, executor)"""
+        with cls._lock:
+            if cls._pending >= cls.capacity:
+                raise PoolSaturatedError(f"{cls._pending} recognition jobs pending")
+            cls._pending += 1
+
+        executor = cls._executor
+        try:
+            try:
+                future = executor.submit(_instrumented, fn, *args)
+            except BrokenProcessPool:
+                cls._restart(executor)
+                executor = cls._executor
+                future = executor.submit(_instrumented, fn, *args)
+        except Exception:
+            cls._release(None)
+            raise
+        # The slot is only released once the worker is really done with the job
+        future.add_done_callback(cls._release)
+        return future, executor
+
+    @classmethod
+    async def _result(cls, future, executor, started, timeout):
+        if timeout is None:
+            timeout = Config.RECOGNITION_TIMEOUT
+        try:
+            result, timings = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            # Drops the job if it has not started yet; a running job cannot be interrupted
+            future.cancel()
+            raise
+        except BrokenProcessPool:
+            cls._restart(executor)
+            raise
+        Metrics.observe_all(timings)
+        # Queueing + pickling + work, as seen by the caller
+        Metrics.observe("recognition_job", time.perf_counter() - started)
+        return result
+
+
+def _warm_worker():
+    """Load the dlib models once per worker instead of on the first request"""
+    import face_recognition  # noqa: F401
+    Metrics.collect_in_worker()
+
+
+def _instrumented(fn, *args):
+    """Run a job and return its stage timings with the result"""
+    Metrics.drain_worker_timings()
+    return fn(*args), Metrics.drain_worker_timings()
+
+
+def _from_frame(fn, ref, *args):
+    """Call ``fn`` on the frame held in a shared-memory slot"""
+    return fn(ref.view(), *args)
+
+
+def _worker_pid():
+    # Holds the worker briefly so each warm-up job lands on a different process
+    time.sleep(0.2)
+    return os.getpid()